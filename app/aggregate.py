@@ -0,0 +1,290 @@
+"""Grouped aggregates over an sObject, returned as a small summary.
+
+Aggregates are pushed down to SOQL ``GROUP BY`` when describe says every
+field involved is groupable/aggregatable. Otherwise the plain records are
+streamed page by page and folded into per-group accumulators, so memory is
+bounded by the number of groups rather than the number of records.
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+from .config import settings
+
+
+OPERATIONS = ("count", "sum", "avg", "min", "max")
+GRANULARITIES = ("day", "month", "quarter", "year")
+_NUMERIC = {"currency", "double", "int", "long", "percent"}
+_TEMPORAL = {"date", "datetime"}
+_FIELD = re.compile(r"^[A-Za-z]\w*(\.[A-Za-z]\w*)*$")
+
+
+@dataclass(frozen=True)
+class Grouping:
+    field: str
+    granularity: Optional[str] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "Grouping":
+        """``StageName`` or ``CloseDate:month``"""
+        field, _, granularity = spec.partition(":")
+        if not _FIELD.match(field):
+            raise ValueError(f"Invalid field {field!r}")
+        if granularity and granularity not in GRANULARITIES:
+            raise ValueError(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+        return cls(field, granularity or None)
+
+    @property
+    def name(self) -> str:
+        return f"{self.field}_{self.granularity}" if self.granularity else self.field
+
+    def bucket(self, value):
+        """Map a raw field value onto its group, e.g. ``2024-03-15`` -> ``2024-03``"""
+        if value is None or self.granularity is None:
+            return value
+        if self.granularity == "day":
+            return value[:10]
+        if self.granularity == "month":
+            return value[:7]
+        if self.granularity == "quarter":
+            return f"{value[:4]}-Q{(int(value[5:7]) - 1) // 3 + 1}"
+        return value[:4]
+
+
+@dataclass(frozen=True)
+class Metric:
+    operation: str
+    field: Optional[str] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "Metric":
+        """``count``, ``count:Field``, ``sum:Amount``, ..."""
+        operation, _, field = spec.partition(":")
+        if operation not in OPERATIONS:
+            raise ValueError(f"Metric must be one of {', '.join(OPERATIONS)}")
+        if field and not _FIELD.match(field):
+            raise ValueError(f"Invalid field {field!r}")
+        if not field and operation != "count":
+            raise ValueError(f"{operation} needs a field, e.g. {operation}:Amount")
+        return cls(operation, field or None)
+
+    @property
+    def name(self) -> str:
+        return f"{self.operation}_{self.field}" if self.field else self.operation
+
+
+def _describe_fields(describe: dict) -> dict[str, dict]:
+    return {f["name"].lower(): f for f in describe.get("fields", [])}
+
+
+def validate(
+    describe: dict, groups: list[Grouping], metrics: list[Metric]
+) -> tuple[list[Grouping], list[Metric]]:
+    """Reject unknown fields and type mismatches that neither strategy could
+    answer; returns the groups and metrics with field names cased as in describe"""
+    fields = _describe_fields(describe)
+    checked_groups, checked_metrics = [], []
+    for group in groups:
+        info = fields.get(group.field.lower())
+        if info is None and "." not in group.field:
+            raise HTTPException(status_code=422, detail=f"Unknown field {group.field}")
+        if group.granularity and info and info.get("type") not in _TEMPORAL:
+            raise HTTPException(
+                status_code=422, detail=f"{group.field} is not a date or datetime field")
+        checked_groups.append(replace(group, field=info["name"]) if info else group)
+    for metric in metrics:
+        info = fields.get(metric.field.lower()) if metric.field else None
+        if metric.field and info is None and "." not in metric.field:
+            raise HTTPException(status_code=422, detail=f"Unknown field {metric.field}")
+        if metric.operation in ("sum", "avg") and info and info.get("type") not in _NUMERIC:
+            raise HTTPException(status_code=422, detail=f"{metric.field} is not numeric")
+        checked_metrics.append(replace(metric, field=info["name"]) if info else metric)
+    return checked_groups, checked_metrics
+
+
+def can_push_down(describe: dict, groups: list[Grouping], metrics: list[Metric]) -> bool:
+    fields = _describe_fields(describe)
+    for group in groups:
+        info = fields.get(group.field.lower())
+        if info is not None and not info.get("groupable", True):
+            return False
+    for metric in metrics:
+        info = fields.get((metric.field or "").lower())
+        if info is not None and not info.get("aggregatable", True):
+            return False
+    return True
+
+
+def _group_expressions(index: int, group: Grouping, field_type: Optional[str]) -> list[tuple[str, str]]:
+    """(expression, alias) pairs selecting and grouping one grouping"""
+    alias = f"g{index}"
+    if group.granularity is None:
+        return [(group.field, alias)]
+    if group.granularity == "day":
+        expression = f"DAY_ONLY({group.field})" if field_type == "datetime" else group.field
+        return [(expression, alias)]
+    parts = [(f"CALENDAR_YEAR({group.field})", f"{alias}y")]
+    if group.granularity == "month":
+        parts.append((f"CALENDAR_MONTH({group.field})", f"{alias}m"))
+    elif group.granularity == "quarter":
+        parts.append((f"CALENDAR_QUARTER({group.field})", f"{alias}q"))
+    return parts
+
+
+def pushdown_soql(
+    sobject: str, describe: dict, groups: list[Grouping], metrics: list[Metric], where: Optional[str]
+) -> str:
+    fields = _describe_fields(describe)
+    select, group_by = [], []
+    for i, group in enumerate(groups):
+        field_type = fields.get(group.field.lower(), {}).get("type")
+        for expression, alias in _group_expressions(i, group, field_type):
+            select.append(f"{expression} {alias}")
+            group_by.append(expression)
+    for i, metric in enumerate(metrics):
+        argument = metric.field or "Id"
+        select.append(f"{metric.operation.upper()}({argument}) m{i}")
+
+    soql = f"SELECT {', '.join(select)} FROM {sobject}"
+    if where:
+        soql += f" WHERE {where}"
+    if group_by:
+        soql += f" GROUP BY {', '.join(group_by)}"
+    return soql
+
+
+def _pushdown_group(index: int, group: Grouping, row: dict):
+    alias = f"g{index}"
+    if group.granularity in (None, "day"):
+        return row.get(alias)
+    year = row.get(f"{alias}y")
+    if year is None:
+        return None
+    if group.granularity == "month":
+        return f"{year:04d}-{row[f'{alias}m']:02d}"
+    if group.granularity == "quarter":
+        return f"{year:04d}-Q{row[f'{alias}q']}"
+    return f"{year:04d}"
+
+
+def pushdown_groups(rows: list[dict], groups: list[Grouping], metrics: list[Metric]) -> list[dict]:
+    """Rename AggregateResult aliases back to group and metric names"""
+    summary = []
+    for row in rows:
+        item = {group.name: _pushdown_group(i, group, row) for i, group in enumerate(groups)}
+        item.update({metric.name: row.get(f"m{i}") for i, metric in enumerate(metrics)})
+        summary.append(item)
+    return _sorted(summary, groups)
+
+
+def stream_soql(sobject: str, groups: list[Grouping], metrics: list[Metric], where: Optional[str]) -> str:
+    fields = list(dict.fromkeys(
+        [g.field for g in groups] + [m.field for m in metrics if m.field])) or ["Id"]
+    soql = f"SELECT {', '.join(fields)} FROM {sobject}"
+    if where:
+        soql += f" WHERE {where}"
+    return soql
+
+
+def _path(field: str):
+    """Accessor for a possibly dotted field, e.g. ``Account.Industry``"""
+    parts = field.split(".")
+    if len(parts) == 1:
+        return lambda record: record.get(field)
+
+    def get(record):
+        for part in parts:
+            if record is None:
+                return None
+            record = record.get(part)
+        return record
+    return get
+
+
+class _Accumulator:
+    __slots__ = ("rows", "count", "total", "low", "high")
+
+    def __init__(self):
+        self.rows = 0
+        self.count = 0
+        self.total = 0
+        self.low = None
+        self.high = None
+
+    def update(self, rows: int, values: list):
+        self.rows += rows
+        if not values:
+            return
+        self.count += len(values)
+        if isinstance(values[0], (int, float)):
+            self.total += sum(values)
+        low, high = min(values), max(values)
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+
+    def result(self, operation: str, field: Optional[str]):
+        if operation == "count":
+            return self.count if field else self.rows
+        if operation == "sum":
+            return self.total if self.count else None
+        if operation == "avg":
+            return self.total / self.count if self.count else None
+        return self.low if operation == "min" else self.high
+
+
+async def stream_groups(
+    pages: AsyncIterator[list[dict]],
+    groups: list[Grouping],
+    metrics: list[Metric],
+    max_groups: int = settings.AGGREGATE_MAX_GROUPS,
+) -> tuple[list[dict], int]:
+    """Fold record pages into per-group metrics; returns (summary, records scanned)"""
+    key_getters = [(_path(g.field), g.bucket) for g in groups]
+    metric_fields = list(dict.fromkeys(m.field for m in metrics))
+    value_getters = {f: _path(f) for f in metric_fields if f}
+    accumulators: dict[tuple, dict[Optional[str], _Accumulator]] = {}
+    scanned = 0
+
+    async for page in pages:
+        scanned += len(page)
+        # Bucket the page first, then update each group once per page with
+        # whole columns of values
+        buckets = defaultdict(list)
+        for record in page:
+            buckets[tuple(bucket(get(record)) for get, bucket in key_getters)].append(record)
+        for key, records in buckets.items():
+            per_field = accumulators.get(key)
+            if per_field is None:
+                if len(accumulators) >= max_groups:
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"More than {max_groups} groups; narrow the grouping or filter")
+                per_field = accumulators[key] = {f: _Accumulator() for f in metric_fields}
+            for field, accumulator in per_field.items():
+                if field is None:
+                    accumulator.update(len(records), [])
+                    continue
+                get = value_getters[field]
+                values = [v for v in map(get, records) if v is not None]
+                accumulator.update(len(records), values)
+
+    if not groups and not accumulators:
+        # Match SOQL, which returns one row of totals even over no records
+        accumulators[()] = {f: _Accumulator() for f in metric_fields}
+    summary = []
+    for key, per_field in accumulators.items():
+        item = {group.name: value for group, value in zip(groups, key)}
+        item.update({
+            m.name: per_field[m.field].result(m.operation, m.field) for m in metrics
+        })
+        summary.append(item)
+    return _sorted(summary, groups), scanned
+
+
+def _sorted(summary: list[dict], groups: list[Grouping]) -> list[dict]:
+    names = [g.name for g in groups]
+    return sorted(summary, key=lambda item: [
+        (item[n] is None, item[n] if item[n] is not None else 0) for n in names])
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+
+from .config import settings
+from .metrics import REDIS_LATENCY
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """Redis client that records the round-trip time of every command"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Return the shared async Redis client, creating it on first use"""
+    global _redis
+    if _redis is None:
+        _redis = InstrumentedRedis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        client, _redis = _redis, None
+        await client.aclose()
+
+
+class LRUCache:
+    """Bounded in-process LRU with an optional per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def values(self):
+        """Every stored value, including entries past their TTL"""
+        return [value for _, value in self._data.values()]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,128 @@
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from redis.exceptions import RedisError
+
+from .cache import LRUCache, get_redis
+from .config import settings
+
+
+# Performs the describe request with the given extra headers and returns a
+# 200 or 304 response; anything else is expected to raise.
+DescribeFetcher = Callable[[dict], Awaitable[httpx.Response]]
+
+
+class DescribeCache:
+    """Two-layer (in-process LRU + Redis) cache for sObject describe payloads.
+
+    Entries are keyed by org, sObject and API version. Within the freshness
+    window an entry is served without touching Salesforce; after that it is
+    revalidated with ``If-None-Match``/``If-Modified-Since``.
+    """
+
+    def __init__(self, maxsize: int, fresh_for: float, redis_ttl: int):
+        self.fresh_for = fresh_for
+        self.redis_ttl = redis_ttl
+        self.local = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def key(instance_url: str, sobject: str, version: str) -> str:
+        return f"describe:{version}:{instance_url}:{sobject.lower()}"
+
+    async def _load_shared(self, key: str) -> Optional[dict]:
+        try:
+            raw = await get_redis().get(key)
+        except RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _store(self, key: str, entry: dict):
+        self.local.set(key, entry)
+        try:
+            await get_redis().set(key, json.dumps(entry), ex=self.redis_ttl)
+        except RedisError:
+            pass
+
+    async def get(
+        self,
+        instance_url: str,
+        sobject: str,
+        fetch: DescribeFetcher,
+        version: str = settings.SALESFORCE_API_VERSION,
+    ) -> dict:
+        key = self.key(instance_url, sobject, version)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = await self._load_shared(key)
+            if entry is not None:
+                self.local.set(key, entry)
+
+        if entry is not None and time.time() - entry["checked_at"] < self.fresh_for:
+            self.hits += 1
+            return entry["body"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await fetch(headers)
+        if response.status_code == 304 and entry is not None:
+            self.hits += 1
+            self.revalidations += 1
+            entry["checked_at"] = time.time()
+        else:
+            self.misses += 1
+            entry = {
+                "body": response.json(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "checked_at": time.time(),
+            }
+        await self._store(key, entry)
+        return entry["body"]
+
+    async def invalidate(
+        self,
+        instance_url: str,
+        sobject: Optional[str] = None,
+        version: str = settings.SALESFORCE_API_VERSION,
+    ):
+        """Drop one sObject, or every cached sObject of an org when ``sobject`` is None"""
+        if sobject is not None:
+            keys = [self.key(instance_url, sobject, version)]
+        else:
+            prefix = f"describe:{version}:{instance_url}:"
+            keys = [k for k in self.local.keys() if k.startswith(prefix)]
+        for key in keys:
+            self.local.pop(key)
+        try:
+            client = get_redis()
+            if sobject is None:
+                keys = [k async for k in client.scan_iter(match=f"{prefix}*")]
+            if keys:
+                await client.delete(*keys)
+        except RedisError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "size": len(self.local),
+        }
+
+
+describe_cache = DescribeCache(
+    maxsize=settings.DESCRIBE_CACHE_MAXSIZE,
+    fresh_for=settings.DESCRIBE_CACHE_FRESH_SECONDS,
+    redis_ttl=settings.DESCRIBE_CACHE_REDIS_TTL,
+)
@@ -0,0 +1,38 @@
+import json
+import logging
+import time
+
+from .config import settings
+
+
+# Chatty INFO loggers: httpx logs every upstream request and SQLAlchemy logs
+# pool lifecycle under the pool class's module
+_QUIET = ("httpx", "httpcore", "app.database.InstrumentedPool")
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name in _QUIET:
+        logging.getLogger(name).setLevel(logging.WARNING)
@@ -1,98 +1,73 @@
+import logging
+import secrets
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Annotated
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from fastapi import Form, Query, Security, Depends, HTTPException
-from urllib.parse import quote
-from .config import settings
-from sqlalchemy.orm import Session
-import requests
-from fastapi import HTTPException, Depends, Header, Request
-import os
 from urllib.parse import urlencode
-from fastapi import FastAPI, HTTPException, Depends, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel, EmailStr
-import redis
-from sqlalchemy import create_engine, Column, String, DateTime
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-import secrets
-from datetime import datetime
-import json
-import base64
-import hashlib
-import secrets
-from sqlalchemy.orm import Session
-from .config import settings
-from app.database import SessionLocal, engine
-from app.models import Base, OAuthState, APIKey, SalesforceToken
-
-
-# Environment variables
-CLIENT_ID = os.getenv("SALESFORCE_CLIENT_ID")
-CLIENT_SECRET = os.getenv("SALESFORCE_CLIENT_SECRET")
-REDIRECT_URI = os.getenv("SALESFORCE_REDIRECT_URI")
-CHATGPT_REDIRECT_URI = os.getenv("CHATGPT_REDIRECT_URI")
-AUTHORIZATION_BASE_URL = "https://login.salesforce.com/services/oauth2/authorize"
-TOKEN_URL = "https://login.salesforce.com/services/oauth2/token"
-
-# Redis setup
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-
-def refresh_salesforce_token(db: Session, token: SalesforceToken) -> SalesforceToken:
-    """Refresh Salesforce access token using refresh token"""
-    response = requests.post(
-        settings.SALESFORCE_TOKEN_URL,
-        data={
-            "grant_type": "refresh_token",
-            "client_id": settings.SALESFORCE_CLIENT_ID,
-            "client_secret": settings.SALESFORCE_CLIENT_SECRET,
-            "refresh_token": token.refresh_token
-        }
-    )
-
-    if response.status_code != 200:
-        db.delete(token)
-        db.commit()
-        raise HTTPException(status_code=401, detail="Failed to refresh token")
-
-    token_data = response.json()
-    token.access_token = token_data["access_token"]
-    token.created_at = datetime.utcnow()
-    db.commit()
-
-    return token
 
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Path, Query, Request, Response, Security
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
-async def verify_salesforce_token(token: str, db: Session) -> bool:
+from .config import settings
+from app.database import get_db, pool_stats
+from app.models import APIKey, SalesforceToken
+from app.salesforce import salesforce_client
+from app.describe_cache import describe_cache
+from app.metadata_index import metadata_index
+from app.token_cache import TokenInfo, hash_token, token_cache
+from app.refresh import identity_user_id, refresh_coordinator
+from app.scheduler import token_activity
+from app.ratelimit import RateLimitHeadersMiddleware, rate_limiter
+from app.query import QueryPage, ndjson_records, query_pages
+from app.sobject_collections import retrieve_records
+from app.org_limiter import BULK
+from app.upstream import SalesforceSession
+from app import aggregate, mirror
+from app.record_cache import record_cache
+from app.overview import account_overview, account_overviews
+from app.shaping import Shape, project_soql, shape_params
+from app.resources import lifespan
+from app.state_store import oauth_state_store
+from app.metrics import MetricsMiddleware, render_metrics
+from app.profiling import ProfilingMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional; gzip only
+    BrotliMiddleware = None
+
+
+logger = logging.getLogger(__name__)
+
+# 15- or 18-character record ID
+SALESFORCE_ID = r"^[a-zA-Z0-9]{15}([a-zA-Z0-9]{3})?$"
+
+
+async def verify_salesforce_token(token: str, db: AsyncSession) -> bool:
     """Verify token with Salesforce and refresh if needed"""
     headers = {
         'Authorization': f'Bearer {token}'
     }
-    response = requests.get(
-        'https://login.salesforce.com/services/oauth2/userinfo', headers=headers)
+    response = await salesforce_client.get(
+        settings.SALESFORCE_USERINFO_URL, headers=headers)
 
     if response.status_code == 401:
         # Token expired, try to refresh
-        db_token = db.query(SalesforceToken).filter(
-            SalesforceToken.access_token == token
-        ).first()
-
-        if db_token:
-            try:
-                new_token = await refresh_salesforce_token(db_token, db)
-                headers['Authorization'] = f'Bearer {new_token}'
-                response = requests.get(
-                    'https://login.salesforce.com/services/oauth2/userinfo',
-                    headers=headers
-                )
-            except HTTPException:
-                return False
+        try:
+            new_token = await refresh_coordinator.refresh(token)
+            headers['Authorization'] = f'Bearer {new_token.access_token}'
+            response = await salesforce_client.get(
+                settings.SALESFORCE_USERINFO_URL,
+                headers=headers
+            )
+        except HTTPException:
+            return False
 
     return response.status_code == 200
 
@@ -104,14 +79,20 @@ security = HTTPBearer(
     auto_error=True
 )
 
+# Operational endpoints take a separate static token, never a Salesforce one
+internal_security = HTTPBearer(scheme_name="Internal token", auto_error=False)
+
+
+def require_internal_token(
+    credentials: HTTPAuthorizationCredentials | None = Security(internal_security),
+):
+    """Allow only callers presenting INTERNAL_TOKEN; hide the endpoint while it is unset"""
+    if not settings.INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials is None or not secrets.compare_digest(
+            credentials.credentials.encode(), settings.INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid internal token")
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # New request models
 
@@ -137,27 +118,42 @@ class SumRequest(BaseModel):
             }
         }
 
-# Rate limiting function
-
+class AccountBatchRequest(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=settings.COLLECTIONS_MAX_IDS)
+    fields: list[str] = Field(default=["Id", "Name"], min_length=1)
 
-def check_rate_limit(api_key: str):
-    key = f"rate_limit:{api_key}"
-    pipe = redis_client.pipeline()
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": ["001xx000003DGb2AAG", "001xx000003DGb3AAG"],
+                "fields": ["Id", "Name", "Industry"]
+            }
+        }
 
-    current_time = datetime.utcnow().timestamp()
-    calls = json.loads(redis_client.get(key) or "[]")
+class AccountOverviewRequest(BaseModel):
+    ids: list[Annotated[str, Field(pattern=SALESFORCE_ID)]] = Field(
+        min_length=1, max_length=settings.OVERVIEW_MAX_IDS)
 
-    recent_calls = [t for t in calls if current_time - t < 60]
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": ["001xx000003DGb2AAG", "001xx000003DGb3AAG"]
+            }
+        }
 
-    if len(recent_calls) >= 2:  # 2 requests per minute
-        raise HTTPException(
-            status_code=429,
-            detail="Rate limit exceeded. Please try again in a minute."
-        )
+class AggregateRequest(BaseModel):
+    group_by: list[str] = Field(default=[], max_length=3)
+    metrics: list[str] = Field(default=["count"], min_length=1, max_length=10)
+    where: str | None = None
 
-    recent_calls.append(current_time)
-    redis_client.set(key, json.dumps(recent_calls), ex=60)
-    return True
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "group_by": ["StageName", "CloseDate:month"],
+                "metrics": ["count", "sum:Amount", "avg:Amount"],
+                "where": "CloseDate = THIS_YEAR"
+            }
+        }
 
 # Define the request model
 
@@ -175,6 +171,8 @@ class GreetingRequest(BaseModel):
 
 # Customize OpenAPI documentation
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     title="Salesforce Metadata explorer app",
     description="An API for accessing Salesforce metadata.",
     version="1.0.0",
@@ -204,6 +202,14 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 # @app.post("/")
@@ -306,26 +312,43 @@ async def health_check():
     return {"message": "Ok!"}
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_internal_token)])
+async def metrics():
+    """Prometheus metrics for routes, Salesforce calls, DB pool, Redis and caches"""
+    body, content_type = render_metrics()
+    # media_type would get a second charset appended to the one already in content_type
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
+@app.get("/health/db", include_in_schema=False, dependencies=[Depends(require_internal_token)])
+async def database_health():
+    """
+    Report database connection pool usage.
+
+    Returns:
+    - Pool size, connections in use and checkout wait times
+    """
+    return pool_stats()
+
+
 @app.get("/login")
-async def login(state, db: Session = Depends(get_db)):
+async def login(state):
     """Initiate Salesforce OAuth flow"""
-    print("LOGIN API CALLED")
-    print(f"REDIRECT URI: {REDIRECT_URI}")  # Add this line
+    logger.info("OAuth login started",
+                extra={"redirect_uri": settings.CHATGPT_REDIRECT_URI})
     # state = secrets.token_urlsafe(32)
 
-    # Store state in database
-    db_state = OAuthState(state=state)
-    db.add(db_state)
-    db.commit()
+    # Store state with an expiry
+    await oauth_state_store.put(state)
 
     params = {
         "response_type": "code",
-        "client_id": CLIENT_ID,
-        "redirect_uri": CHATGPT_REDIRECT_URI,
+        "client_id": settings.SALESFORCE_CLIENT_ID,
+        "redirect_uri": settings.CHATGPT_REDIRECT_URI,
         "state": state,
     }
 
-    authorization_url = f"{AUTHORIZATION_BASE_URL}?{urlencode(params)}"
+    authorization_url = f"{settings.SALESFORCE_AUTH_URL}?{urlencode(params)}"
     return RedirectResponse(authorization_url)
 # Single security scheme for protected routes
 oauth2_scheme = HTTPBearer()
@@ -336,33 +359,28 @@ oauth2_scheme = HTTPBearer()
 @app.post("/callback")
 async def callback(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Handle OAuth callback from Salesforce"""
     # Get form data from request body
     form_data = await request.form()
-    print("form_data", form_data)
+    logger.info("OAuth callback received",
+                extra={"fields": sorted(form_data.keys())})
 
     # Extract code and state from form data
     code = form_data.get("code")
-    # state = form_data.get("state")
-
-    # if not code or not state:
-    #     raise HTTPException(
-    #         status_code=400,
-    #         detail="Missing required parameters"
-    #     )
-
-    # # Verify state
-    # db_state = db.query(OAuthState).filter(OAuthState.state == state).first()
-    # if not db_state:
-    #     raise HTTPException(
-    #         status_code=400,
-    #         detail="Invalid state parameter"
-    #     )
+    state = form_data.get("state")
+
+    # ChatGPT's token exchange does not forward state, so it is only
+    # verified (and consumed) when present
+    if state and not await oauth_state_store.pop(state):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid state parameter"
+        )
 
     # Exchange code for token
-    token_response = requests.post(
+    token_response = await salesforce_client.post(
         settings.SALESFORCE_TOKEN_URL,
         data={
             "grant_type": "authorization_code",
@@ -384,115 +402,354 @@ async def callback(
     # Store token
     db_token = SalesforceToken(
         access_token=token_data["access_token"],
+        upstream_token=token_data["access_token"],
         refresh_token=token_data.get("refresh_token", ""),
-        instance_url=token_data["instance_url"]
+        instance_url=token_data["instance_url"],
+        user_id=identity_user_id(token_data)
     )
 
     db.add(db_token)
-    # db.delete(db_state)
-    db.commit()
+    await db.commit()
     return token_data
 # Helper function to validate token and get Salesforce session
 
 
 async def get_salesforce_session(
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db)
-) -> SalesforceToken:
-    token = db.query(SalesforceToken).filter(
-        SalesforceToken.access_token == credentials.credentials
-    ).first()
+    db: AsyncSession = Depends(get_db)
+) -> TokenInfo:
+    token = await token_cache.get(credentials.credentials)
+
+    if token is None:
+        db_token = await db.get(SalesforceToken, credentials.credentials)
 
-    if not token:
-        raise HTTPException(status_code=401, detail="Invalid access token")
+        if not db_token:
+            raise HTTPException(status_code=401, detail="Invalid access token")
 
-    if datetime.utcnow() - token.created_at > timedelta(hours=2):
-        token = refresh_salesforce_token(db, token)
+        token = TokenInfo.from_model(db_token)
+        await token_cache.set(token)
+
+    if datetime.utcnow() - token.created_at > timedelta(seconds=settings.TOKEN_MAX_AGE):
+        token = await refresh_coordinator.refresh(token.access_token, token.created_at)
+
+    await token_activity.touch(token.access_token)
 
     return token
 
 
-@app.get("/metadata")
+def check_rate_limit(route: str):
+    """Dependency enforcing the per-key and per-org rate limits of ``route``"""
+    async def dependency(
+        request: Request,
+        token: TokenInfo = Depends(get_salesforce_session)
+    ):
+        result = await rate_limiter.check(
+            route, token.access_token, token.instance_url)
+        if not result.allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again later.",
+                headers=result.headers()
+            )
+        request.state.rate_limit_headers = result.headers()
+    return dependency
+
+
+def get_salesforce_api(
+    token: TokenInfo = Depends(get_salesforce_session)
+) -> SalesforceSession:
+    return SalesforceSession(token)
+
+
+@app.get("/metadata", dependencies=[Depends(check_rate_limit("metadata"))])
 async def get_salesforce_metadata(
-    token: SalesforceToken = Depends(get_salesforce_session)
+    sobject: Annotated[str, Query(pattern=r"^[A-Za-z]\w*$")] = "Opportunity",
+    refresh: bool = False,
+    shape: Shape = Depends(shape_params),
+    sf: SalesforceSession = Depends(get_salesforce_api)
 ):
-    headers = {
-        "Authorization": f"Bearer {token.access_token}",
-        "Content-Type": "application/json"
-    }
+    """
+    Describe a Salesforce object
 
-    response = requests.get(
-        f"{token.instance_url}/services/data/v59.0/sobjects/opportunity/describe",
-        headers=headers
-    )
+    Parameters:
+    - sobject: The object to describe
+    - refresh: Bypass the describe cache
+    - fields, strip_nulls, strip_metadata, max_bytes, cursor: Response shaping;
+      fields selects which of the object's fields are described
 
-    if response.status_code == 401:
-        token = refresh_salesforce_token(db, token)
-        headers["Authorization"] = f"Bearer {token.access_token}"
-        response = requests.get(
-            f"{token.instance_url}/services/data/v59.0/sobjects/account/describe",
-            headers=headers
-        )
+    Returns:
+    - The describe result, with next_cursor when max_bytes cut the field list short
+    """
+    if refresh:
+        await describe_cache.invalidate(sf.instance_url, sobject)
+    describe = await describe_cache.get(sf.instance_url, sobject, partial(sf.describe, sobject))
+    logger.debug("Describe loaded",
+                 extra={"sobject": sobject, "fields": len(describe.get("fields", []))})
+    return shape.describe(describe)
+
+@app.get("/metadata/search", dependencies=[Depends(check_rate_limit("metadata"))])
+async def search_metadata(
+    q: Annotated[str, Query(min_length=2)],
+    kind: Annotated[str | None, Query(pattern="^(object|field)$")] = None,
+    sobject: Annotated[str | None, Query(pattern=r"^[A-Za-z]\w*$")] = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = 20,
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Find objects and fields by name or label, e.g. "which field holds the renewal date"
 
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="Failed to fetch metadata after token refresh"
-            )
-    print(response.json())
+    Parameters:
+    - q: Text to match against API names and labels
+    - kind: Only "object" or only "field" matches
+    - sobject: Only fields of this object; it is described now if not yet indexed
+    - limit: Maximum number of matches
+
+    Returns:
+    - results: Best matches first, each with kind, object, name, label and type
+    - index: How many objects are indexed and whether every field is indexed yet
+    """
+    index = await metadata_index.ensure(sf, sobject)
     return {
-        "metadata": "jbcwjkw"
+        "results": metadata_index.search(index, q, kind, sobject, limit),
+        "index": index.summary(),
     }
 
-@app.get("/accounts/{account_id}")
+
+@app.post("/accounts/batch", dependencies=[Depends(check_rate_limit("accounts_batch"))])
+async def get_accounts_batch(
+    request: AccountBatchRequest,
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Get many Salesforce accounts in a handful of upstream calls
+
+    Parameters:
+    - request: AccountBatchRequest with account IDs and the fields to return
+
+    Returns:
+    - results: Mapping of account ID to {"record": ...} or {"error": ...}
+    """
+    async def fetch(url: str, body: dict):
+        return await sf.post(url, endpoint="collections", json=body, priority=BULK)
+
+    results = await retrieve_records(
+        fetch, sf.instance_url, "Account", request.ids, request.fields)
+    return {"results": results}
+
+
+@app.post("/accounts/overview", dependencies=[Depends(check_rate_limit("accounts_overview"))])
+async def get_account_overviews(
+    request: AccountOverviewRequest,
+    strip_nulls: bool = False,
+    strip_metadata: bool = False,
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Get the overview of many accounts, batched into Composite requests
+
+    Parameters:
+    - request: AccountOverviewRequest with account IDs
+    - strip_nulls, strip_metadata: Drop null fields and Salesforce attributes
+
+    Returns:
+    - results: Mapping of account ID to an overview or {"error": ...}
+    """
+    async def fetch(url: str, body: dict):
+        return await sf.post(url, endpoint="composite", json=body, priority=BULK)
+
+    shape = Shape(strip_nulls=strip_nulls, strip_metadata=strip_metadata)
+    results = await account_overviews(fetch, sf.instance_url, request.ids)
+    return {"results": shape.record(results)}
+
+
+@app.get("/accounts/{account_id}/overview", dependencies=[Depends(check_rate_limit("accounts"))])
+async def get_account_overview(
+    account_id: Annotated[str, Path(pattern=SALESFORCE_ID)],
+    strip_nulls: bool = False,
+    strip_metadata: bool = False,
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Get an account with its contacts, open opportunities and recent activity
+    in one upstream round trip
+
+    Parameters:
+    - account_id: The Salesforce ID of the account
+    - strip_nulls, strip_metadata: Drop null fields and Salesforce attributes
+
+    Returns:
+    - account, contacts, opportunities, activities; errors lists sections that failed
+    """
+    async def fetch(url: str, body: dict):
+        return await sf.post(url, endpoint="composite", json=body)
+
+    shape = Shape(strip_nulls=strip_nulls, strip_metadata=strip_metadata)
+    return shape.record(await account_overview(fetch, sf.instance_url, account_id))
+
+
+@app.get("/accounts/{account_id}", dependencies=[Depends(check_rate_limit("accounts"))])
 async def get_account(
     account_id: str,
-    token: SalesforceToken = Depends(get_salesforce_session)
+    max_staleness: Annotated[float | None, Query(ge=0)] = None,
+    shape: Shape = Depends(shape_params),
+    sf: SalesforceSession = Depends(get_salesforce_api)
 ):
     """
     Get detailed information about a specific Salesforce account
     
     Parameters:
     - account_id: The Salesforce ID of the account
+    - max_staleness: Seconds of mirror lag acceptable; 0 always asks Salesforce
+    - fields, strip_nulls, strip_metadata, max_bytes, cursor: Response shaping
     
     Returns:
-    - Account details from Salesforce
+    - Account details from Salesforce, with next_cursor when max_bytes cut it short
     """
-    headers = {
-        "Authorization": f"Bearer {token.access_token}",
-        "Content-Type": "application/json"
-    }
+    staleness = settings.MIRROR_MAX_STALENESS if max_staleness is None else max_staleness
+    if await mirror.is_fresh(sf.instance_url, "Account", staleness):
+        record = await mirror.get_record(sf.instance_url, "Account", account_id)
+        if record is not None:
+            return shape.truncate_record(shape.record(record))
+
+    # Relationship fields cannot be selected on a record GET, so those are
+    # projected here instead
+    fields = shape.fields if shape.fields and not any("." in f for f in shape.fields) else None
+
+    async def fetch(conditional_headers: dict):
+        response = await sf.get(
+            sf.url(f"/sobjects/Account/{account_id}"),
+            endpoint="record", headers=conditional_headers,
+            params={"fields": ",".join(fields)} if fields else None)
+
+        if response.status_code == 404:
+            raise HTTPException(
+                status_code=404,
+                detail="Account not found"
+            )
+        if response.status_code not in (200, 304):
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="Failed to fetch account details"
+            )
+        return response
+
+    content = await record_cache.get(
+        sf.instance_url, hash_token(sf.token.access_token), "Account", account_id, fetch, fields)
+    if shape.passthrough and (fields or not shape.fields):
+        return Response(content=content, media_type="application/json")
+    return shape.truncate_record(shape.record(orjson.loads(content)))
+
+
+@app.get("/query", dependencies=[Depends(check_rate_limit("query"))])
+async def query_records(
+    q: str | None = None,
+    include_deleted: bool = False,
+    batch_size: Annotated[int | None, Query(ge=200, le=2000)] = None,
+    max_staleness: Annotated[float | None, Query(ge=0)] = None,
+    shape: Shape = Depends(shape_params),
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Run a SOQL query and stream every matching record
 
-    response = requests.get(
-        f"{token.instance_url}/services/data/v59.0/sobjects/Account/{account_id}",
-        headers=headers
+    Parameters:
+    - q: The SOQL query; may be omitted when continuing from a cursor
+    - include_deleted: Use queryAll to include deleted and archived records
+    - batch_size: Records per upstream page (200-2000)
+    - max_staleness: Seconds of mirror lag acceptable for simple
+      ``SELECT ... FROM Object [LIMIT n]`` queries; 0 always asks Salesforce
+    - fields, strip_nulls, strip_metadata, max_bytes, cursor: Response shaping;
+      fields replaces a plain SELECT list so only those fields are fetched
+
+    Returns:
+    - Records as newline-delimited JSON, following nextRecordsUrl until exhausted,
+      ending with a {"next_cursor": ...} line when max_bytes cut it short
+    """
+    cursor = shape.cursor or {}
+    if q is None and "l" not in cursor:
+        raise HTTPException(status_code=422, detail="q is required")
+    if q is not None and shape.fields:
+        q = project_soql(q, shape.fields) or q
+
+    staleness = settings.MIRROR_MAX_STALENESS if max_staleness is None else max_staleness
+    simple = None if include_deleted or q is None else mirror.parse_simple_query(q)
+    if simple and ("o" in cursor or await mirror.is_fresh(sf.instance_url, simple[0], staleness)):
+        pages = mirror.query_mirror(sf.instance_url, *simple, offset=cursor.get("o", 0))
+    else:
+        pages = None
+
+    if pages is None:
+        headers = {"Sforce-Query-Options": f"batchSize={batch_size}"} if batch_size else None
+        pages = query_pages(
+            sf.query_fetcher(headers), sf.instance_url, q, include_deleted,
+            locator=cursor.get("l"), skip=cursor.get("s", 0))
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = QueryPage([])
+    except BaseException:
+        await pages.aclose()
+        raise
+
+    reshape = shape.record if shape.fields or shape.strip_nulls or shape.strip_metadata else None
+    return StreamingResponse(
+        ndjson_records(first_page, pages, reshape, shape.max_bytes),
+        media_type="application/x-ndjson"
     )
 
-    if response.status_code == 401:
-        token = refresh_salesforce_token(db, token)
-        headers["Authorization"] = f"Bearer {token.access_token}"
-        response = requests.get(
-            f"{token.instance_url}/services/data/v59.0/sobjects/Account/{account_id}",
-            headers=headers
-        )
+@app.post("/opportunities/aggregate", dependencies=[Depends(check_rate_limit("aggregate"))])
+async def aggregate_opportunities(
+    request: AggregateRequest,
+    sf: SalesforceSession = Depends(get_salesforce_api)
+):
+    """
+    Summarise opportunities server-side instead of returning every record
 
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="Failed to fetch account details after token refresh"
-            )
-    
-    if response.status_code == 404:
-        raise HTTPException(
-            status_code=404,
-            detail="Account not found"
-        )
+    Parameters:
+    - request: AggregateRequest with group_by fields (``Field`` or
+      ``DateField:day|month|quarter|year``), metrics (``count``,
+      ``count:Field``, ``sum|avg|min|max:Field``) and an optional SOQL WHERE clause
 
-    return response.json()
+    Returns:
+    - groups: One entry per group with the group values and each metric
+    - strategy: "soql" when aggregated by Salesforce, "stream" when aggregated here
+    """
+    try:
+        groups = [aggregate.Grouping.parse(spec) for spec in request.group_by]
+        metrics = [aggregate.Metric.parse(spec) for spec in request.metrics]
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    fetch = sf.query_fetcher()
+    describe = await describe_cache.get(sf.instance_url, "Opportunity", partial(sf.describe, "Opportunity"))
+    groups, metrics = aggregate.validate(describe, groups, metrics)
+
+    if aggregate.can_push_down(describe, groups, metrics):
+        soql = aggregate.pushdown_soql("Opportunity", describe, groups, metrics, request.where)
+        try:
+            rows = [row async for page in query_pages(fetch, sf.instance_url, soql) for row in page]
+        except HTTPException as exc:
+            # e.g. more than 2000 groups, which aggregate queries cannot page through
+            if exc.status_code != 400:
+                raise
+            logger.info("Aggregate pushdown rejected, streaming instead", extra={"soql": soql})
+        else:
+            return {
+                "strategy": "soql",
+                "groups": aggregate.pushdown_groups(rows, groups, metrics),
+            }
+
+    soql = aggregate.stream_soql("Opportunity", groups, metrics, request.where)
+    pages = query_pages(fetch, sf.instance_url, soql)
+    try:
+        summary, scanned = await aggregate.stream_groups(pages, groups, metrics)
+    finally:
+        await pages.aclose()
+    return {"strategy": "stream", "groups": summary, "records_scanned": scanned}
 
 # @app.get("/opportunities")
 # async def get_opportunities(
-#     token: SalesforceToken = Depends(get_salesforce_session)
+#     token: TokenInfo = Depends(get_salesforce_session)
 # ):
 #     query = "SELECT Id, Name, Amount, StageName, CloseDate FROM Opportunity"
 #     encoded_query = quote(query)
@@ -0,0 +1,158 @@
+"""Batched garbage collection for ``salesforce_tokens`` and ``oauth_states``.
+
+Run once from the command line:
+
+    python -m app.maintenance [--batch-size 1000] [--token-retention-days 30]
+
+or periodically inside the app by setting MAINTENANCE_INTERVAL.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+
+from .cache import get_redis
+from .config import settings
+from .database import SessionLocal, dispose_engine, init_engine
+from .token_cache import token_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Each batch deletes at most :limit rows picked by physical location, so the
+# statement touches a bounded set of tuples and holds its locks briefly.
+_DELETE_BATCH = """
+DELETE FROM {table}
+WHERE ctid IN (
+    SELECT ctid FROM {table}
+    WHERE created_at < :cutoff
+    LIMIT :limit
+)
+RETURNING {key}
+"""
+
+
+async def prune_table(
+    table: str,
+    key: str,
+    cutoff: datetime,
+    batch_size: int,
+    pause: float = 0.0,
+) -> dict:
+    """Delete rows created before ``cutoff`` in batches; returns a report entry"""
+    statement = text(_DELETE_BATCH.format(table=table, key=key))
+    deleted = batches = 0
+    start = time.perf_counter()
+    while True:
+        async with SessionLocal() as db:
+            result = await db.execute(statement, {"cutoff": cutoff, "limit": batch_size})
+            keys = list(result.scalars())
+            await db.commit()
+        batches += 1
+        deleted += len(keys)
+        if table == "salesforce_tokens":
+            for access_token in keys:
+                await token_cache.invalidate(access_token)
+        if len(keys) < batch_size:
+            break
+        if pause:
+            await asyncio.sleep(pause)
+    return {
+        "deleted": deleted,
+        "batches": batches,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def run_maintenance(
+    batch_size: int = settings.MAINTENANCE_BATCH_SIZE,
+    token_retention_days: float = settings.MAINTENANCE_TOKEN_RETENTION_DAYS,
+    state_ttl: int = settings.OAUTH_STATE_TTL,
+    pause: float = settings.MAINTENANCE_BATCH_PAUSE,
+) -> dict:
+    now = datetime.utcnow()
+    return {
+        "salesforce_tokens": await prune_table(
+            "salesforce_tokens", "access_token",
+            now - timedelta(days=token_retention_days), batch_size, pause),
+        "oauth_states": await prune_table(
+            "oauth_states", "state",
+            now - timedelta(seconds=state_ttl), batch_size, pause),
+    }
+
+
+class MaintenanceTask:
+    """Runs run_maintenance() every ``interval`` seconds in one worker at a time"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+            try:
+                if not await get_redis().set(
+                        "maintenance_lock", 1, nx=True, ex=max(int(self.interval), 1)):
+                    continue
+            except RedisError:
+                pass
+            try:
+                report = await run_maintenance()
+                logger.info("Maintenance finished: %s", json.dumps(report))
+            except Exception:
+                logger.exception("Maintenance failed")
+
+
+maintenance_task = MaintenanceTask(interval=settings.MAINTENANCE_INTERVAL)
+
+
+async def _main(args):
+    init_engine()
+    try:
+        report = await run_maintenance(
+            batch_size=args.batch_size,
+            token_retention_days=args.token_retention_days,
+            state_ttl=args.state_ttl,
+            pause=args.pause,
+        )
+    finally:
+        await dispose_engine()
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Delete expired tokens and OAuth states in bounded batches")
+    parser.add_argument("--batch-size", type=int, default=settings.MAINTENANCE_BATCH_SIZE)
+    parser.add_argument(
+        "--token-retention-days", type=float,
+        default=settings.MAINTENANCE_TOKEN_RETENTION_DAYS)
+    parser.add_argument("--state-ttl", type=int, default=settings.OAUTH_STATE_TTL)
+    parser.add_argument("--pause", type=float, default=settings.MAINTENANCE_BATCH_PAUSE)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
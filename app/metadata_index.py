@@ -0,0 +1,306 @@
+"""Per-org searchable index of objects and fields.
+
+The object list comes from describeGlobal and is searchable as soon as it
+is loaded. Fields are added as objects are described: on demand when a
+search names an object, and by a background crawl that describes the
+remaining objects with bounded concurrency. describeGlobal is rechecked
+with If-Modified-Since and a 304 skips the crawl; otherwise indexed objects
+are revalidated with their own ETag, so only new or changed objects are
+downloaded and rewritten. The index keeps just the compact fields, their
+digest and the validators, not the describe payloads.
+
+Each org's index lives in a worker-local LRU and in one Redis hash
+(``_global`` plus one entry per described object), which other workers
+and restarts load instead of crawling again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+from .cache import LRUCache, get_redis
+from .config import settings
+from .org_limiter import BULK
+from .upstream import SalesforceSession
+
+
+logger = logging.getLogger(__name__)
+
+# Objects that mirror another object's data and would only add noise
+_NOISE_SUFFIXES = ("History", "Share", "Feed", "ChangeEvent", "__Tag")
+_GLOBAL = "_global"
+
+
+def _compact_object(sobject: dict) -> dict:
+    return {
+        "name": sobject["name"],
+        "label": sobject.get("label"),
+        "labelPlural": sobject.get("labelPlural"),
+        "custom": sobject.get("custom", False),
+        "queryable": sobject.get("queryable", True),
+    }
+
+
+def _compact_field(f: dict) -> dict:
+    entry = {"name": f["name"], "label": f.get("label"), "type": f.get("type")}
+    if f.get("referenceTo"):
+        entry["referenceTo"] = f["referenceTo"]
+        entry["relationshipName"] = f.get("relationshipName")
+    return entry
+
+
+@dataclass
+class OrgIndex:
+    objects: dict[str, dict] = field(default_factory=dict)
+    fields: dict[str, list[dict]] = field(default_factory=dict)
+    digests: dict[str, str] = field(default_factory=dict)
+    # ETag and Last-Modified of each indexed describe
+    validators: dict[str, dict] = field(default_factory=dict)
+    last_modified: Optional[str] = None
+    checked_at: float = 0.0
+    crawl: Optional[asyncio.Task] = None
+
+    def summary(self) -> dict:
+        crawlable = [n for n, o in self.objects.items() if _crawlable(o)]
+        described = sum(1 for n in crawlable if n in self.fields)
+        return {
+            "objects": len(self.objects),
+            "described": described,
+            "complete": described == len(crawlable),
+        }
+
+
+def _crawlable(sobject: dict) -> bool:
+    return sobject["queryable"] and not sobject["name"].endswith(_NOISE_SUFFIXES)
+
+
+def _score(query: str, name: str, label: Optional[str]) -> int:
+    name = name.lower()
+    label = (label or "").lower()
+    if query == name or query == name.removesuffix("__c"):
+        return 100
+    if query == label:
+        return 90
+    if name.startswith(query):
+        return 60
+    if label.startswith(query):
+        return 50
+    if query in name:
+        return 30
+    if query in label:
+        return 20
+    words = query.split()
+    if len(words) > 1 and all(w in name or w in label for w in words):
+        return 10
+    return 0
+
+
+class MetadataIndex:
+    def __init__(self, maxsize: int, local_ttl: float, refresh_after: float, redis_ttl: int):
+        self.local = LRUCache(maxsize, ttl=local_ttl)
+        self.refresh_after = refresh_after
+        self.redis_ttl = redis_ttl
+
+    @staticmethod
+    def key(instance_url: str, version: str = settings.SALESFORCE_API_VERSION) -> str:
+        return f"metadata_index:{version}:{instance_url}"
+
+    async def _load(self, instance_url: str) -> OrgIndex:
+        index = self.local.get(instance_url)
+        if index is not None:
+            return index
+        index = OrgIndex()
+        try:
+            raw = await get_redis().hgetall(self.key(instance_url))
+        except RedisError:
+            raw = {}
+        for name, value in raw.items():
+            name = name.decode() if isinstance(name, bytes) else name
+            entry = json.loads(value)
+            if name == _GLOBAL:
+                index.objects = {o["name"].lower(): o for o in entry["objects"]}
+                index.last_modified = entry.get("last_modified")
+                index.checked_at = entry.get("checked_at", 0.0)
+            else:
+                index.fields[name] = entry["fields"]
+                index.digests[name] = entry["digest"]
+                index.validators[name] = {
+                    "etag": entry.get("etag"), "last_modified": entry.get("last_modified")}
+        self.local.set(instance_url, index)
+        return index
+
+    async def _persist(self, instance_url: str, mapping: dict, removed: list[str] = ()):
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            key = self.key(instance_url)
+            if mapping:
+                pipe.hset(key, mapping={k: json.dumps(v) for k, v in mapping.items()})
+            if removed:
+                pipe.hdel(key, *removed)
+            pipe.expire(key, self.redis_ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    async def _refresh_global(self, sf: SalesforceSession, index: OrgIndex) -> bool:
+        """Recheck describeGlobal; True unless Salesforce answered 304"""
+        headers = {"If-Modified-Since": index.last_modified} if index.last_modified and index.objects else {}
+        response = await sf.get(
+            sf.url("/sobjects"), endpoint="describe", headers=headers, priority=BULK)
+        removed = []
+        if response.status_code == 304:
+            index.checked_at = time.time()
+        elif response.status_code == 200:
+            objects = {
+                o["name"].lower(): _compact_object(o) for o in response.json()["sobjects"]
+            }
+            removed = [name for name in index.fields if name not in objects]
+            for name in removed:
+                index.fields.pop(name, None)
+                index.digests.pop(name, None)
+                index.validators.pop(name, None)
+            index.objects = objects
+            index.last_modified = response.headers.get("Last-Modified")
+            index.checked_at = time.time()
+        else:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch describeGlobal")
+
+        await self._persist(sf.instance_url, {_GLOBAL: {
+            "objects": list(index.objects.values()),
+            "last_modified": index.last_modified,
+            "checked_at": index.checked_at,
+        }}, removed)
+        return response.status_code == 200
+
+    async def _describe(self, sf: SalesforceSession, index: OrgIndex, name: str) -> bool:
+        """Index one object's fields; True when they changed"""
+        sobject = index.objects[name]["name"]
+        headers = {}
+        validators = index.validators.get(name, {}) if name in index.fields else {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        response = await sf.describe(sobject, headers, priority=BULK)
+        if response.status_code == 304:
+            return False
+
+        fields = [_compact_field(f) for f in response.json().get("fields", [])]
+        digest = hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+        changed = index.digests.get(name) != digest
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if not changed and index.validators.get(name) == validators:
+            return False
+        index.fields[name] = fields
+        index.digests[name] = digest
+        index.validators[name] = validators
+        await self._persist(sf.instance_url, {name: {"fields": fields, "digest": digest, **validators}})
+        return changed
+
+    async def _crawl(self, sf: SalesforceSession, index: OrgIndex):
+        """Describe new crawlable objects and revalidate indexed ones,
+        ``concurrency`` at a time"""
+        lock = f"metadata_index_lock:{sf.instance_url}"
+        try:
+            if not await get_redis().set(lock, 1, nx=True, ex=int(settings.METADATA_INDEX_LOCK_TTL)):
+                return
+        except RedisError:
+            pass
+        semaphore = asyncio.Semaphore(settings.METADATA_INDEX_CONCURRENCY)
+        changed = 0
+
+        async def describe(name: str):
+            nonlocal changed
+            async with semaphore:
+                try:
+                    changed += await self._describe(sf, index, name)
+                except HTTPException as exc:
+                    logger.warning("Describe failed while indexing",
+                                   extra={"sobject": name, "detail": exc.detail})
+
+        try:
+            names = [n for n, o in index.objects.items() if _crawlable(o)]
+            await asyncio.gather(*(describe(n) for n in names))
+            logger.info("Metadata index refreshed", extra={
+                "org": sf.instance_url, "objects": len(names), "changed": changed})
+        finally:
+            try:
+                await get_redis().delete(lock)
+            except RedisError:
+                pass
+
+    async def ensure(self, sf: SalesforceSession, sobject: Optional[str] = None) -> OrgIndex:
+        """Load the org's index, refreshing it when stale.
+
+        describeGlobal is rechecked inline; describing objects happens in a
+        background crawl, except for ``sobject`` which is described now if
+        it is not indexed yet.
+        """
+        index = await self._load(sf.instance_url)
+        changed = False
+        if not index.objects or time.time() - index.checked_at > self.refresh_after:
+            changed = await self._refresh_global(sf, index)
+        idle = index.crawl is None or index.crawl.done()
+        # An incomplete index is also crawled once per load, which retries failed describes
+        if idle and (changed or (index.crawl is None and not index.summary()["complete"])):
+            index.crawl = asyncio.create_task(self._crawl(sf, index))
+
+        if sobject is not None:
+            name = sobject.lower()
+            if name not in index.objects:
+                raise HTTPException(status_code=404, detail=f"Unknown object {sobject}")
+            if name not in index.fields:
+                await self._describe(sf, index, name)
+        return index
+
+    def search(
+        self,
+        index: OrgIndex,
+        query: str,
+        kind: Optional[str] = None,
+        sobject: Optional[str] = None,
+        limit: int = 20,
+    ) -> list[dict]:
+        """Rank objects and fields whose name or label matches ``query``"""
+        query = query.strip().lower()
+        scored = []
+        if kind in (None, "object") and sobject is None:
+            for obj in index.objects.values():
+                score = max(_score(query, obj["name"], obj["label"]),
+                            _score(query, obj["name"], obj["labelPlural"]))
+                if score:
+                    scored.append((score, {"kind": "object", **obj}))
+        if kind in (None, "field"):
+            names = [sobject.lower()] if sobject else list(index.fields)
+            for name in names:
+                object_name = index.objects[name]["name"]
+                for f in index.fields.get(name, []):
+                    score = _score(query, f["name"], f["label"])
+                    if score:
+                        scored.append((score, {"kind": "field", "object": object_name, **f}))
+        scored.sort(key=lambda item: -item[0])
+        return [entry for _, entry in scored[:limit]]
+
+    async def stop(self):
+        """Cancel background crawls and wait for them; called on application shutdown"""
+        crawls = [index.crawl for index in self.local.values() if index.crawl is not None]
+        for crawl in crawls:
+            crawl.cancel()
+        await asyncio.gather(*crawls, return_exceptions=True)
+
+
+metadata_index = MetadataIndex(
+    maxsize=settings.METADATA_INDEX_MAX_ORGS,
+    local_ttl=settings.METADATA_INDEX_LOCAL_TTL,
+    refresh_after=settings.METADATA_INDEX_REFRESH_SECONDS,
+    redis_ttl=settings.METADATA_INDEX_REDIS_TTL,
+)
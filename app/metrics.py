@@ -0,0 +1,149 @@
+import hashlib
+import re
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+ROUTE_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of requests served by this app",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "salesforce_request_duration_seconds",
+    "Latency of Salesforce API calls",
+    ["method", "endpoint"],
+)
+UPSTREAM_RESPONSES = Counter(
+    "salesforce_responses_total",
+    "Salesforce API responses by status (\"error\" for transport failures)",
+    ["method", "endpoint", "status"],
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Round-trip time of Redis commands",
+    ["command"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+
+_VERSION = re.compile(r"^v\d+\.\d+$")
+_RECORD_ID = re.compile(r"^[a-zA-Z0-9]{15}(?:[a-zA-Z0-9]{3})?$")
+
+
+def upstream_endpoint(path: str) -> str:
+    """Collapse API versions, record IDs and query locators into a low-cardinality label"""
+    segments = []
+    for segment in path.strip("/").split("/"):
+        if _VERSION.match(segment):
+            segments.append("{version}")
+        elif (_RECORD_ID.match(segment) and any(c.isdigit() for c in segment)) or "-" in segment:
+            segments.append("{id}")
+        else:
+            segments.append(segment)
+    return "/" + "/".join(segments)
+
+
+def org_label(instance_url: str) -> str:
+    """Stable label for an org that keeps its instance URL out of the metrics"""
+    return hashlib.sha256(instance_url.encode()).hexdigest()[:12]
+
+
+def observe_upstream(method: str, path: str, status, seconds: float):
+    endpoint = upstream_endpoint(path)
+    UPSTREAM_LATENCY.labels(method, endpoint).observe(seconds)
+    UPSTREAM_RESPONSES.labels(method, endpoint, str(status)).inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, labelled by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            ROUTE_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            ).observe(time.perf_counter() - start)
+
+
+class StatsCollector:
+    """Exposes DB pool and cache statistics, read at scrape time"""
+
+    def describe(self):
+        # Keeps registration from calling collect() while modules are still importing
+        return []
+
+    def collect(self):
+        from .database import pool_stats
+        from .org_limiter import org_limiter
+        from .describe_cache import describe_cache
+        from .record_cache import record_cache
+        from .token_cache import token_cache
+
+        stats = pool_stats()
+        if stats.get("initialized"):
+            for name in ("size", "checked_out", "checked_in", "overflow"):
+                yield GaugeMetricFamily(f"db_pool_{name}", f"Database pool {name}", value=stats[name])
+            yield CounterMetricFamily(
+                "db_pool_checkouts", "Connection checkouts", value=stats["checkouts"])
+            yield GaugeMetricFamily(
+                "db_pool_checkout_wait_avg_seconds", "Mean checkout wait",
+                value=stats["checkout_wait_avg"])
+            yield GaugeMetricFamily(
+                "db_pool_checkout_wait_max_seconds", "Longest checkout wait",
+                value=stats["checkout_wait_max"])
+
+        caches = {
+            "describe": describe_cache.stats(),
+            "record": record_cache.stats(),
+            "token": {
+                "hits": token_cache.local.hits,
+                "misses": token_cache.local.misses,
+                "size": len(token_cache.local),
+            },
+        }
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries held in process", labels=["cache"])
+        for name, values in caches.items():
+            hits.add_metric([name], values["hits"])
+            misses.add_metric([name], values["misses"])
+            size.add_metric([name], values["size"])
+        yield hits
+        yield misses
+        yield size
+
+        org_stats = org_limiter.stats()
+        for name in ("limit", "in_flight", "queued"):
+            gauge = GaugeMetricFamily(
+                f"salesforce_org_{name}", f"Per-org upstream concurrency {name}", labels=["org"])
+            for org, values in org_stats.items():
+                gauge.add_metric([org_label(org)], values[name])
+            yield gauge
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,319 @@
+"""Incremental local mirror of selected sObjects per org.
+
+The first sync of an object copies every record. Later syncs copy records
+whose SystemModstamp is at or after the stored watermark, and apply
+getDeleted for the window since the previous sync. Run once with
+
+    python -m app.mirror
+
+or periodically inside the app with MIRROR_ENABLED.
+
+Mirroring is opt-in per org through MIRROR_ORGS, which names the org's
+integration user. Syncs use that user's token, so the mirror holds the
+records and fields it can see, and reads from the mirror bypass the
+requesting user's own sharing rules and field-level security. Orgs that are
+not listed are never synced nor served from the mirror.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from .cache import LRUCache, close_redis, get_redis
+from .config import settings
+from .database import SessionLocal, dispose_engine, init_engine
+from .describe_cache import describe_cache
+from .models import MirroredRecord, MirrorWatermark, SalesforceToken
+from .org_limiter import BULK
+from .query import QueryPage, query_pages
+from .salesforce import salesforce_client
+from .token_cache import TokenInfo
+from .upstream import SalesforceSession
+
+
+logger = logging.getLogger(__name__)
+
+# getDeleted only covers the last 30 days
+_DELETED_WINDOW = timedelta(days=29)
+_MIN_DELETED_SPAN = timedelta(minutes=1)
+_SIMPLE_SOQL = re.compile(
+    r"^\s*SELECT\s+(?P<fields>\w+(?:\s*,\s*\w+)*)\s+FROM\s+(?P<sobject>\w+)"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_sf_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Salesforce datetime into a naive UTC datetime"""
+    if not value:
+        return None
+    parsed = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def soql_datetime(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def _mirror_fields(sf: SalesforceSession, sobject: str) -> list[str]:
+    describe = await describe_cache.get(
+        sf.instance_url, sobject, partial(sf.describe, sobject, priority=BULK))
+    # Compound fields cannot be selected alongside their components
+    return [f["name"] for f in describe["fields"] if f.get("type") not in ("address", "location")]
+
+
+async def _apply_deletes(sf: SalesforceSession, sobject: str, start: datetime, end: datetime) -> tuple[int, datetime]:
+    response = await sf.get(
+        sf.url(f"/sobjects/{sobject}/deleted/"), endpoint="query", priority=BULK,
+        params={"start": soql_datetime(start), "end": soql_datetime(end)})
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch deleted records")
+    body = response.json()
+    ids = [r["id"] for r in body.get("deletedRecords", [])]
+    if ids:
+        async with SessionLocal() as db:
+            await db.execute(delete(MirroredRecord).where(
+                MirroredRecord.instance_url == sf.instance_url,
+                MirroredRecord.sobject == sobject,
+                MirroredRecord.record_id.in_(ids),
+            ))
+            await db.commit()
+    return len(ids), parse_sf_datetime(body.get("latestDateCovered")) or end
+
+
+async def sync_object(sf: SalesforceSession, sobject: str) -> dict:
+    """Bring one object of one org up to date; returns counts of rows changed"""
+    started_at = datetime.utcnow()
+    async with SessionLocal() as db:
+        watermark = await db.get(MirrorWatermark, (sf.instance_url, sobject))
+        if watermark is None:
+            # Track deletions from before the first page is copied, so a
+            # later run still applies them if this initial load is interrupted
+            watermark = MirrorWatermark(
+                instance_url=sf.instance_url, sobject=sobject, deleted_until=started_at)
+            db.add(watermark)
+            await db.commit()
+
+    fields = await _mirror_fields(sf, sobject)
+    soql = f"SELECT {', '.join(fields)} FROM {sobject}"
+    if watermark.last_modstamp is not None:
+        # >= so records sharing the watermark's millisecond are never skipped;
+        # the upsert makes re-copying them harmless
+        soql += f" WHERE SystemModstamp >= {soql_datetime(watermark.last_modstamp)}"
+    soql += " ORDER BY SystemModstamp"
+
+    upserted = 0
+    async for page in query_pages(sf.query_fetcher(), sf.instance_url, soql):
+        if not page:
+            continue
+        rows = [{
+            "instance_url": sf.instance_url,
+            "sobject": sobject,
+            "record_id": record["Id"],
+            "data": record,
+            "system_modstamp": parse_sf_datetime(record.get("SystemModstamp")),
+            "synced_at": datetime.utcnow(),
+        } for record in page]
+        statement = insert(MirroredRecord).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["instance_url", "sobject", "record_id"],
+            set_={
+                "data": statement.excluded.data,
+                "system_modstamp": statement.excluded.system_modstamp,
+                "synced_at": statement.excluded.synced_at,
+            },
+        )
+        async with SessionLocal() as db:
+            await db.execute(statement)
+            # Advance the watermark per page so an interrupted sync resumes
+            watermark.last_modstamp = max(
+                (row["system_modstamp"] for row in rows if row["system_modstamp"]),
+                default=watermark.last_modstamp)
+            await db.merge(watermark)
+            await db.commit()
+        upserted += len(rows)
+
+    deleted = 0
+    now = datetime.utcnow()
+    # Watermarks from before deleted_until was set up front fall back to the whole window
+    start = max(watermark.deleted_until or datetime.min, now - _DELETED_WINDOW)
+    # getDeleted rejects windows shorter than a minute; the next run covers it
+    if now - start > _MIN_DELETED_SPAN:
+        deleted, watermark.deleted_until = await _apply_deletes(sf, sobject, start, now)
+
+    watermark.last_synced_at = started_at
+    async with SessionLocal() as db:
+        await db.merge(watermark)
+        await db.commit()
+    _fresh.pop((sf.instance_url, sobject))
+    return {"upserted": upserted, "deleted": deleted}
+
+
+async def org_sessions() -> list[SalesforceSession]:
+    """One session per opted-in org, using its integration user's newest token"""
+    if not settings.MIRROR_ORGS:
+        return []
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(SalesforceToken)
+            .where(tuple_(SalesforceToken.instance_url, SalesforceToken.user_id).in_(
+                list(settings.MIRROR_ORGS.items())))
+            .distinct(SalesforceToken.instance_url)
+            .order_by(SalesforceToken.instance_url, SalesforceToken.created_at.desc())
+        )
+        sessions = [SalesforceSession(TokenInfo.from_model(t)) for t in result.scalars()]
+    missing = set(settings.MIRROR_ORGS) - {sf.instance_url for sf in sessions}
+    if missing:
+        logger.warning("No token of the integration user to mirror with",
+                       extra={"orgs": sorted(missing)})
+    return sessions
+
+
+async def sync_all(objects: Optional[list[str]] = None) -> dict:
+    report = {}
+    for sf in await org_sessions():
+        for sobject in objects or settings.MIRROR_OBJECTS:
+            lock = f"mirror_lock:{sf.instance_url}:{sobject}"
+            try:
+                if not await get_redis().set(lock, 1, nx=True, ex=int(settings.MIRROR_LOCK_TTL)):
+                    continue
+            except RedisError:
+                pass
+            try:
+                report[f"{sf.instance_url}:{sobject}"] = await sync_object(sf, sobject)
+            except HTTPException as exc:
+                logger.warning("Mirror sync failed", extra={
+                    "org": sf.instance_url, "sobject": sobject, "detail": exc.detail})
+            finally:
+                try:
+                    await get_redis().delete(lock)
+                except RedisError:
+                    pass
+    return report
+
+
+# Per-worker memo of the last sync time per (org, sObject)
+_fresh = LRUCache(maxsize=1000, ttl=5.0)
+
+
+async def _last_synced(instance_url: str, sobject: str) -> Optional[datetime]:
+    key = (instance_url, sobject)
+    cached = _fresh.get(key)
+    if cached is not None:
+        return cached or None
+    async with SessionLocal() as db:
+        watermark = await db.get(MirrorWatermark, key)
+    last_synced = watermark.last_synced_at if watermark else None
+    _fresh.set(key, last_synced or False)
+    return last_synced
+
+
+async def is_fresh(instance_url: str, sobject: str, max_staleness: float) -> bool:
+    """True when the org has opted in to mirroring ``sobject`` and it was
+    synced within ``max_staleness`` seconds"""
+    if (not settings.MIRROR_ENABLED or max_staleness <= 0 or instance_url not in settings.MIRROR_ORGS
+            or sobject not in settings.MIRROR_OBJECTS):
+        return False
+    last_synced = await _last_synced(instance_url, sobject)
+    return last_synced is not None and datetime.utcnow() - last_synced <= timedelta(seconds=max_staleness)
+
+
+async def get_record(instance_url: str, sobject: str, record_id: str) -> Optional[dict]:
+    async with SessionLocal() as db:
+        row = await db.get(MirroredRecord, (instance_url, sobject, record_id))
+    return row.data if row else None
+
+
+def parse_simple_query(soql: str) -> Optional[tuple[str, list[str], Optional[int]]]:
+    """Recognise ``SELECT a, b FROM Object [LIMIT n]``, the form the mirror can answer"""
+    match = _SIMPLE_SOQL.match(soql)
+    if not match:
+        return None
+    fields = [f.strip() for f in match.group("fields").split(",")]
+    sobject = next(
+        (o for o in settings.MIRROR_OBJECTS if o.lower() == match.group("sobject").lower()),
+        match.group("sobject"))
+    limit = int(match.group("limit")) if match.group("limit") else None
+    return sobject, fields, limit
+
+
+async def query_mirror(
+    instance_url: str, sobject: str, fields: list[str], limit: Optional[int], offset: int = 0
+) -> AsyncIterator[QueryPage]:
+    """Yield mirrored records projected onto ``fields``, streamed in pages"""
+    statement = select(MirroredRecord.data).where(
+        MirroredRecord.instance_url == instance_url,
+        MirroredRecord.sobject == sobject,
+    ).order_by(MirroredRecord.record_id).offset(offset)
+    if limit is not None:
+        statement = statement.limit(max(limit - offset, 0))
+
+    async with SessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=settings.MIRROR_PAGE_SIZE))
+        async for partition in result.partitions():
+            page = QueryPage([], skip=offset)
+            for (data,) in partition:
+                lowered = {k.lower(): v for k, v in data.items()}
+                record = {"attributes": {"type": sobject}}
+                record.update({f: lowered.get(f.lower()) for f in fields})
+                page.append(record)
+            offset += len(page)
+            yield page
+
+
+class MirrorTask:
+    """Runs sync_all() every ``interval`` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and settings.MIRROR_ENABLED:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                report = await sync_all()
+                if report:
+                    logger.info("Mirror sync finished", extra={"report": report})
+            except Exception:
+                logger.exception("Mirror sync failed")
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+
+mirror_task = MirrorTask(interval=settings.MIRROR_INTERVAL)
+
+
+async def _main():
+    init_engine()
+    try:
+        report = await sync_all()
+    finally:
+        await salesforce_client.aclose()
+        await close_redis()
+        await dispose_engine()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index, JSON
 from datetime import datetime
 from .database import Base
 
@@ -7,16 +7,21 @@ class OAuthState(Base):
     __tablename__ = "oauth_states"
 
     state = Column(String, primary_key=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class SalesforceToken(Base):
     __tablename__ = "salesforce_tokens"
 
+    # The bearer handed to the client at login; it stays the key across
+    # refreshes, which only rotate upstream_token
     access_token = Column(String, primary_key=True)
+    upstream_token = Column(String)
     refresh_token = Column(String)
     instance_url = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Salesforce user ID from the token response's identity URL
+    user_id = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class APIKey(Base):
@@ -25,3 +30,29 @@ class APIKey(Base):
     api_key = Column(String, primary_key=True, index=True)
     email = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MirroredRecord(Base):
+    __tablename__ = "mirrored_records"
+    __table_args__ = (
+        Index("ix_mirrored_records_modstamp", "instance_url", "sobject", "system_modstamp"),
+    )
+
+    instance_url = Column(String, primary_key=True)
+    sobject = Column(String, primary_key=True)
+    record_id = Column(String, primary_key=True)
+    data = Column(JSON, nullable=False)
+    system_modstamp = Column(DateTime)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MirrorWatermark(Base):
+    __tablename__ = "mirror_watermarks"
+
+    instance_url = Column(String, primary_key=True)
+    sobject = Column(String, primary_key=True)
+    # Highest SystemModstamp copied so far
+    last_modstamp = Column(DateTime)
+    # Upper bound of the last getDeleted window applied
+    deleted_until = Column(DateTime)
+    last_synced_at = Column(DateTime)
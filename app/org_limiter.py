@@ -0,0 +1,249 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+from .cache import get_redis
+from .config import settings
+
+
+INTERACTIVE = 0
+BULK = 1
+
+_API_USAGE = re.compile(r"api-usage=(\d+)/(\d+)")
+
+
+def parse_limit_info(header: Optional[str]) -> Optional[tuple[int, int]]:
+    """Parse ``Sforce-Limit-Info: api-usage=25/5000`` into (used, max)"""
+    if not header:
+        return None
+    match = _API_USAGE.search(header)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+class OrgState:
+    def __init__(self, initial_limit: float):
+        self.limit = initial_limit
+        self.in_flight = 0
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        # Best latency seen per endpoint kind; a query page and a record GET
+        # have very different baselines
+        self.min_latency: dict[str, float] = {}
+        self.last_decrease = 0.0
+        self.api_used: Optional[int] = None
+        self.api_max: Optional[int] = None
+        # Wall-clock time Salesforce reported api_used/api_max, possibly to another worker
+        self.api_observed_at = 0.0
+        self.api_synced_at = 0.0
+        self.api_published_at = 0.0
+
+
+class SlotOutcome:
+    """Filled in by the caller of slot() with the result of the upstream call.
+
+    ``ok`` stays None when the call ended without an answer from Salesforce
+    (cancelled, or failed before sending), which says nothing about its load.
+    """
+
+    def __init__(self):
+        self.ok: Optional[bool] = None
+        self.limit_info: Optional[str] = None
+
+
+class OrgConcurrencyLimiter:
+    """Per-org upstream scheduler with an AIMD concurrency cap.
+
+    The cap grows by roughly one slot per window of successful calls and is
+    halved on errors or when latency climbs well above the best latency
+    seen for the same kind of call. Calls over the cap wait in a priority queue (interactive before
+    bulk); when the queue is full, a wait times out, or the org's daily API
+    allocation (from ``Sforce-Limit-Info``, shared through Redis) runs low,
+    calls are shed with a 429. Usage figures older than ``usage_max_age``
+    let one call per interval through as a probe, so an org recovers once
+    its allocation does.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float,
+        min_limit: float,
+        max_limit: float,
+        latency_tolerance: float,
+        max_queue: int,
+        queue_timeout: float,
+        bulk_reserve: float,
+        sync_interval: float,
+        usage_max_age: float,
+    ):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bulk_reserve = bulk_reserve
+        self.sync_interval = sync_interval
+        self.usage_max_age = usage_max_age
+        self._orgs: dict[str, OrgState] = {}
+        self._seq = itertools.count()
+
+    def state(self, org: str) -> OrgState:
+        state = self._orgs.get(org)
+        if state is None:
+            state = self._orgs[org] = OrgState(self.initial_limit)
+        return state
+
+    @staticmethod
+    def _shed(detail: str, retry_after: int = 1):
+        raise HTTPException(
+            status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    async def _check_allocation(self, org: str, state: OrgState, priority: int):
+        now = time.monotonic()
+        if now - state.api_synced_at > self.sync_interval:
+            state.api_synced_at = now
+            try:
+                used, maximum, observed_at = await get_redis().hmget(
+                    f"org_api_usage:{org}", "used", "max", "at")
+            except RedisError:
+                pass
+            else:
+                if used is None or maximum is None:
+                    # Expired or flushed: a local figure is no fresher than that
+                    state.api_used = state.api_max = None
+                elif float(observed_at or 0) >= state.api_observed_at:
+                    state.api_used, state.api_max = int(used), int(maximum)
+                    state.api_observed_at = float(observed_at or 0)
+        if state.api_used is None or not state.api_max:
+            return
+        remaining = state.api_max - state.api_used
+        if remaining <= 0:
+            detail = "Salesforce API allocation exhausted for this org"
+        elif priority >= BULK and remaining < state.api_max * self.bulk_reserve:
+            detail = "Salesforce API allocation reserved for interactive requests"
+        else:
+            return
+        wall = time.time()
+        if wall - state.api_observed_at < self.usage_max_age:
+            self._shed(detail, 60)
+        # Shed calls never see a new Sforce-Limit-Info, so let this one
+        # through as a probe and shed the rest until it or the interval ends
+        state.api_observed_at = wall
+
+    async def _acquire(self, state: OrgState, priority: int):
+        if state.in_flight < int(state.limit) and not state.waiters:
+            state.in_flight += 1
+            return
+        if len(state.waiters) >= self.max_queue:
+            self._shed("Too many queued Salesforce requests for this org")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(state.waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except BaseException as exc:
+            # Timed out or cancelled (client gone, prefetch dropped): never
+            # leave a dead waiter behind to be granted a slot nobody releases
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as the wait ended; give it back
+                self._release_slot(state)
+            else:
+                future.cancel()
+                state.waiters.remove(entry)
+                heapq.heapify(state.waiters)
+            if isinstance(exc, asyncio.TimeoutError):
+                self._shed("Timed out waiting for a Salesforce request slot")
+            raise
+
+    def _release_slot(self, state: OrgState):
+        state.in_flight -= 1
+        while state.waiters and state.in_flight < int(state.limit):
+            _, _, future = heapq.heappop(state.waiters)
+            if not future.done():
+                state.in_flight += 1
+                future.set_result(None)
+
+    def _adjust(self, state: OrgState, kind: str, latency: float, ok: bool):
+        now = time.monotonic()
+        baseline = state.min_latency.get(kind)
+        if ok:
+            baseline = state.min_latency[kind] = latency if baseline is None else min(baseline, latency)
+            if latency <= baseline * self.latency_tolerance:
+                state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+                return
+        # Decrease at most once per latency window so one burst of failures
+        # does not collapse the cap to the floor
+        if now - state.last_decrease > (baseline or 1.0):
+            state.limit = max(self.min_limit, state.limit / 2)
+            state.last_decrease = now
+
+    async def _record_usage(self, org: str, state: OrgState, header: Optional[str]):
+        usage = parse_limit_info(header)
+        if usage is None:
+            return
+        state.api_used, state.api_max = usage
+        state.api_observed_at = time.time()
+        now = time.monotonic()
+        if now - state.api_published_at < self.sync_interval:
+            return
+        state.api_published_at = now
+        try:
+            key = f"org_api_usage:{org}"
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.hset(key, mapping={"used": usage[0], "max": usage[1], "at": state.api_observed_at})
+            pipe.expire(key, 86400)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self, org: str, priority: int = INTERACTIVE, kind: str = "default"):
+        """Hold one upstream slot for ``org``; the body should set ``outcome``.
+
+        ``kind`` is the endpoint kind (record, query, ...) whose latency
+        baseline this call is compared against.
+        """
+        state = self.state(org)
+        await self._check_allocation(org, state, priority)
+        await self._acquire(state, priority)
+        outcome = SlotOutcome()
+        start = time.perf_counter()
+        try:
+            yield outcome
+        finally:
+            if outcome.ok is not None:
+                self._adjust(state, kind, time.perf_counter() - start, outcome.ok)
+            self._release_slot(state)
+            await self._record_usage(org, state, outcome.limit_info)
+
+    def stats(self) -> dict:
+        return {
+            org: {
+                "limit": round(state.limit, 2),
+                "in_flight": state.in_flight,
+                "queued": len(state.waiters),
+                "api_used": state.api_used,
+                "api_max": state.api_max,
+            }
+            for org, state in self._orgs.items()
+        }
+
+
+org_limiter = OrgConcurrencyLimiter(
+    initial_limit=settings.ORG_CONCURRENCY_INITIAL,
+    min_limit=settings.ORG_CONCURRENCY_MIN,
+    max_limit=settings.ORG_CONCURRENCY_MAX,
+    latency_tolerance=settings.ORG_CONCURRENCY_LATENCY_TOLERANCE,
+    max_queue=settings.ORG_QUEUE_MAX,
+    queue_timeout=settings.ORG_QUEUE_TIMEOUT,
+    bulk_reserve=settings.ORG_API_BULK_RESERVE,
+    sync_interval=settings.ORG_API_USAGE_SYNC_INTERVAL,
+    usage_max_age=settings.ORG_API_USAGE_MAX_AGE,
+)
@@ -0,0 +1,208 @@
+"""Account overview: the account with its contacts, open opportunities and
+recent activity, fetched in one Composite API round trip.
+
+A single account uses references between subrequests, so the related
+queries filter on ``@{account.Id}`` and are skipped by Salesforce when the
+account does not exist. Several accounts are fetched with one Account query
+per chunk whose parent-child subqueries apply the row limit to each account,
+so a busy account cannot crowd out the others. Up to five chunk queries
+share a Composite request, its limit for query subrequests.
+
+In batches, activities come from the account's ``Tasks`` and ``Events``
+relationships, i.e. those whose WhatId is the account; the single-account
+overview also includes activities logged against its contacts.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote_plus
+
+import httpx
+from fastapi import HTTPException
+
+from .config import settings
+
+
+# Performs an authenticated POST with the given JSON body and returns the
+# upstream response as-is.
+CompositeFetcher = Callable[[str, dict], Awaitable[httpx.Response]]
+
+SECTIONS = ("contacts", "opportunities", "tasks", "events")
+
+
+def _query_url(soql: str) -> str:
+    # References such as @{account.Id} must reach Salesforce unescaped
+    return (
+        f"/services/data/{settings.SALESFORCE_API_VERSION}/query/?q="
+        + quote_plus(soql, safe="@{}'")
+    )
+
+
+def _sections() -> dict[str, tuple[str, str, str, Optional[str], str]]:
+    """Per section: sObject, Account child relationship, fields, filter, order"""
+    fields = ", ".join
+    recent = f"ActivityDate = LAST_N_DAYS:{settings.OVERVIEW_ACTIVITY_DAYS}"
+    return {
+        "contacts": (
+            "Contact", "Contacts", fields(settings.OVERVIEW_CONTACT_FIELDS),
+            None, "LastModifiedDate DESC",
+        ),
+        "opportunities": (
+            "Opportunity", "Opportunities", fields(settings.OVERVIEW_OPPORTUNITY_FIELDS),
+            "IsClosed = false", "CloseDate",
+        ),
+        "tasks": (
+            "Task", "Tasks", fields(settings.OVERVIEW_ACTIVITY_FIELDS), recent, "ActivityDate DESC",
+        ),
+        "events": (
+            "Event", "Events", fields(settings.OVERVIEW_ACTIVITY_FIELDS), recent, "ActivityDate DESC",
+        ),
+    }
+
+
+def _related_queries(account_id: str, limit: int) -> dict[str, str]:
+    queries = {}
+    for name, (sobject, _, fields, condition, order) in _sections().items():
+        where = f"AccountId = {account_id}" + (f" AND {condition}" if condition else "")
+        queries[name] = f"SELECT {fields} FROM {sobject} WHERE {where} ORDER BY {order} LIMIT {limit}"
+    return queries
+
+
+def _accounts_query(account_ids: list[str], limit: int) -> str:
+    """One Account query whose subqueries fetch up to ``limit`` rows per account"""
+    subqueries = []
+    for sobject, relationship, fields, condition, order in _sections().values():
+        where = f" WHERE {condition}" if condition else ""
+        subqueries.append(f"(SELECT {fields} FROM {relationship}{where} ORDER BY {order} LIMIT {limit})")
+    id_list = ", ".join(f"'{account_id}'" for account_id in account_ids)
+    return (
+        f"SELECT {', '.join(settings.OVERVIEW_ACCOUNT_FIELDS)}, {', '.join(subqueries)}"
+        f" FROM Account WHERE Id IN ({id_list})"
+    )
+
+
+def _activities(tasks: list[dict], events: list[dict], limit: int) -> list[dict]:
+    merged = sorted(tasks + events, key=lambda r: r.get("ActivityDate") or "", reverse=True)
+    return merged[:limit]
+
+
+async def _composite(fetch: CompositeFetcher, instance_url: str, subrequests: list[dict]) -> dict:
+    """Run one Composite request; returns each subrequest's response by referenceId"""
+    url = f"{instance_url}/services/data/{settings.SALESFORCE_API_VERSION}/composite"
+    response = await fetch(url, {"allOrNone": False, "compositeRequest": subrequests})
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Composite request failed")
+    return {r["referenceId"]: r for r in response.json()["compositeResponse"]}
+
+
+def _error(result: dict) -> dict:
+    body = result.get("body")
+    first = body[0] if isinstance(body, list) and body else {}
+    return {
+        "error": first.get("errorCode", "UPSTREAM_ERROR"),
+        "status": result.get("httpStatusCode"),
+        "message": first.get("message"),
+    }
+
+
+async def account_overview(
+    fetch: CompositeFetcher,
+    instance_url: str,
+    account_id: str,
+    limit: int = settings.OVERVIEW_RELATED_LIMIT,
+) -> dict:
+    """Overview of one account in a single Composite request"""
+    account_url = (
+        f"/services/data/{settings.SALESFORCE_API_VERSION}/sobjects/Account/{account_id}"
+        f"?fields={','.join(settings.OVERVIEW_ACCOUNT_FIELDS)}"
+    )
+    subrequests = [{"method": "GET", "url": account_url, "referenceId": "account"}]
+    subrequests += [
+        {"method": "GET", "url": _query_url(soql), "referenceId": name}
+        for name, soql in _related_queries("'@{account.Id}'", limit).items()
+    ]
+    results = await _composite(fetch, instance_url, subrequests)
+
+    account = results["account"]
+    if account["httpStatusCode"] == 404:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if account["httpStatusCode"] != 200:
+        raise HTTPException(status_code=account["httpStatusCode"], detail="Failed to fetch account details")
+
+    overview = {"account": account["body"]}
+    errors = {}
+    related = {}
+    for name in SECTIONS:
+        result = results[name]
+        if result["httpStatusCode"] == 200:
+            related[name] = result["body"]["records"]
+        else:
+            related[name] = []
+            errors[name] = _error(result)
+    overview["contacts"] = related["contacts"]
+    overview["opportunities"] = related["opportunities"]
+    overview["activities"] = _activities(related["tasks"], related["events"], limit)
+    if errors:
+        overview["errors"] = errors
+    return overview
+
+
+async def account_overviews(
+    fetch: CompositeFetcher,
+    instance_url: str,
+    account_ids: list[str],
+    limit: int = settings.OVERVIEW_RELATED_LIMIT,
+    chunk_size: int = settings.OVERVIEW_BATCH_SIZE,
+    concurrency: int = settings.COLLECTIONS_CONCURRENCY,
+) -> dict[str, dict]:
+    """Overviews of many accounts, one Account query per ``chunk_size`` IDs
+    and up to five queries per Composite request.
+
+    Every requested ID is present in the result, either as an overview or
+    as ``{"error": ...}``.
+    """
+    unique_ids = list(dict.fromkeys(account_ids))
+    chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+    batches = [chunks[i:i + 5] for i in range(0, len(chunks), 5)]
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[str, dict] = {}
+
+    async def fetch_batch(batch: list[list[str]]):
+        subrequests = [
+            {"method": "GET", "url": _query_url(_accounts_query(chunk, limit)), "referenceId": f"chunk{i}"}
+            for i, chunk in enumerate(batch)
+        ]
+        async with semaphore:
+            try:
+                responses = await _composite(fetch, instance_url, subrequests)
+            except (httpx.HTTPError, HTTPException) as exc:
+                for account_id in (a for chunk in batch for a in chunk):
+                    results[account_id] = {"error": "UPSTREAM_ERROR", "message": str(exc)}
+                return
+
+        for i, chunk in enumerate(batch):
+            result = responses[f"chunk{i}"]
+            if result["httpStatusCode"] != 200:
+                for account_id in chunk:
+                    results[account_id] = _error(result)
+                continue
+            # Salesforce may return 15- or 18-character IDs; match on the 15-character prefix
+            overviews = {record["Id"][:15]: _overview(record, limit) for record in result["body"]["records"]}
+            for account_id in chunk:
+                results[account_id] = overviews.get(account_id[:15], {"error": "NOT_FOUND"})
+
+    await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+    return {account_id: results[account_id] for account_id in unique_ids}
+
+
+def _overview(record: dict, limit: int) -> dict:
+    """Split an Account row with subquery results into an overview"""
+    related = {}
+    for name, (_, relationship, *_) in _sections().items():
+        # An empty subquery comes back as null rather than an empty result
+        related[name] = (record.pop(relationship, None) or {}).get("records", [])
+    return {
+        "account": record,
+        "contacts": related["contacts"],
+        "opportunities": related["opportunities"],
+        "activities": _activities(related["tasks"], related["events"], limit),
+    }
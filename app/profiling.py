@@ -0,0 +1,51 @@
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+
+from .config import settings
+
+
+class ProfilingMiddleware:
+    """Opt-in cProfile capture of individual requests.
+
+    A request is profiled when PROFILING_ENABLED is set and either it carries
+    the ``X-Profile: 1`` header or it is picked by PROFILE_SAMPLE_RATE. Only one
+    request per worker is profiled at a time. Profiles are written to
+    PROFILE_DIR as ``.prof`` files for ``pstats``/snakeviz. The profiler sees
+    the whole thread, so other requests interleaved on the event loop show up
+    in the same profile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        if not settings.PROFILING_ENABLED:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile" and value == b"1":
+                return True
+        return random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+            self._lock.release()
+            route = scope.get("route")
+            name = (route.path if route is not None else scope["path"]).strip("/").replace("/", "_")
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(
+                settings.PROFILE_DIR,
+                f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{name or 'root'}-{uuid.uuid4().hex[:8]}.prof",
+            ))
@@ -0,0 +1,113 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from .config import settings
+from .shaping import encode_cursor, fit
+
+
+# Performs an authenticated GET against the org and returns a 200 response;
+# anything else is expected to raise.
+PageFetcher = Callable[[str, Optional[dict]], Awaitable[httpx.Response]]
+
+
+class QueryPage(list):
+    """A page of records that remembers how to fetch it again.
+
+    ``locator`` is the upstream URL path of the page and ``skip`` how many of
+    its records were dropped before these. Pages without a locator are
+    addressed by absolute offset (``skip``) instead, e.g. from the mirror.
+    """
+
+    def __init__(self, records: list[dict], locator: Optional[str] = None, skip: int = 0):
+        super().__init__(records)
+        self.locator = locator
+        self.skip = skip
+
+    def resume_from(self, index: int) -> dict:
+        """Cursor state that continues with the ``index``-th record of this page"""
+        if self.locator:
+            return {"l": self.locator, "s": self.skip + index}
+        return {"o": self.skip + index}
+
+
+def query_locator(soql: str, include_deleted: bool = False) -> str:
+    resource = "queryAll" if include_deleted else "query"
+    return f"/services/data/{settings.SALESFORCE_API_VERSION}/{resource}?{urlencode({'q': soql})}"
+
+
+async def query_pages(
+    fetch: PageFetcher,
+    instance_url: str,
+    soql: Optional[str],
+    include_deleted: bool = False,
+    locator: Optional[str] = None,
+    skip: int = 0,
+) -> AsyncIterator[QueryPage]:
+    """Yield SOQL result pages, following ``nextRecordsUrl`` lazily.
+
+    The next page is requested while the caller is still consuming the
+    current one, so at most one page is buffered and one is in flight.
+    Passing ``locator`` and ``skip`` from a cursor resumes a query instead.
+    """
+    if locator is None:
+        locator = query_locator(soql, include_deleted)
+    elif not re.match(r"^/services/data/v[\d.]+/query(All)?[/?]", locator):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    pending: Optional[asyncio.Task] = asyncio.create_task(
+        fetch(f"{instance_url}{locator}", None))
+    try:
+        while pending is not None:
+            response = await pending
+            body = orjson.loads(response.content)
+            next_url = body.get("nextRecordsUrl")
+            pending = (
+                asyncio.create_task(fetch(f"{instance_url}{next_url}", None))
+                if next_url else None
+            )
+            yield QueryPage(body.get("records", [])[skip:], locator, skip)
+            locator, skip = next_url, 0
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def ndjson_records(
+    first_page: QueryPage,
+    pages: AsyncIterator[QueryPage],
+    shape: Optional[Callable[[dict], dict]] = None,
+    max_bytes: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """Encode records as NDJSON, one chunk per page.
+
+    Errors after the response has started are reported as a final
+    ``{"error": ...}`` line since the status code is already sent. Once
+    ``max_bytes`` would be exceeded the stream ends with a
+    ``{"next_cursor": ...}`` line instead.
+    """
+    page = first_page
+    sent = 0
+    try:
+        while True:
+            if page:
+                lines = [orjson.dumps(shape(r) if shape else r) + b"\n" for r in page]
+                if max_bytes:
+                    count = fit(map(len, lines), max_bytes - sent, minimum=0 if sent else 1)
+                    if count < len(lines):
+                        cursor = encode_cursor(page.resume_from(count))
+                        yield b"".join(lines[:count]) + orjson.dumps({"next_cursor": cursor}) + b"\n"
+                        return
+                    sent += sum(map(len, lines))
+                yield b"".join(lines)
+            page = await pages.__anext__()
+    except StopAsyncIteration:
+        return
+    except HTTPException as exc:
+        yield orjson.dumps({"error": exc.detail, "status": exc.status_code}) + b"\n"
+    finally:
+        await pages.aclose()
@@ -0,0 +1,224 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from .cache import LRUCache, get_redis
+from .config import settings
+
+
+# GCRA over every key in KEYS; ARGV holds (emission interval, tolerance) in ms
+# for each key. The request is admitted, and every key's TAT advanced, only if
+# all keys allow it, so per-key and per-org limits cost a single round trip.
+_GCRA = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local allowed = 1
+local retry_after = 0
+local remaining = 0
+local reset = 0
+local binding = 1
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+    local emission = tonumber(ARGV[2 * i - 1])
+    local tolerance = tonumber(ARGV[2 * i])
+    local tat = tonumber(redis.call("GET", key) or now)
+    if tat < now then
+        tat = now
+    end
+    local new_tat = tat + emission
+    local wait = new_tat - tolerance - now
+    if wait > 0 then
+        allowed = 0
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+    new_tats[i] = new_tat
+    local left = math.floor((tolerance - (new_tat - now)) / emission)
+    if i == 1 or left < remaining then
+        remaining = left
+        reset = new_tat - now
+        binding = i
+    end
+end
+if allowed == 1 then
+    for i, key in ipairs(KEYS) do
+        redis.call("SET", key, new_tats[i], "PX", math.ceil(new_tats[i] - now))
+    end
+end
+return {allowed, math.max(remaining, 0), math.ceil(retry_after), math.ceil(reset), binding}
+"""
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Rate:
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """Parse ``"<count>/<second|minute|hour|day>"``"""
+        count, _, unit = value.partition("/")
+        return cls(int(count), _PERIODS[unit.strip().rstrip("s")])
+
+    @property
+    def emission_ms(self) -> float:
+        return self.period * 1000 / self.limit
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float
+    retry_after: float
+
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(max(int(self.reset + 0.999), 0)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(int(self.retry_after + 0.999), 1))
+        return headers
+
+
+class TokenBucket:
+    def __init__(self, rate: Rate):
+        self.rate = rate
+        self.tokens = float(rate.limit)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(
+            self.rate.limit,
+            self.tokens + (now - self.updated) * self.rate.limit / self.rate.period)
+        self.updated = now
+
+
+class RateLimiter:
+    """Per-route, per-key and per-org limits enforced atomically in Redis.
+
+    Falls back to an in-process token bucket per worker while Redis is
+    unreachable.
+    """
+
+    def __init__(self, default_per_key: str, default_per_org: str, routes: dict, retry_redis_after: float = 5.0):
+        self.default_per_key = Rate.parse(default_per_key)
+        self.default_per_org = Rate.parse(default_per_org)
+        self.routes = {
+            route: {scope: Rate.parse(rate) for scope, rate in scopes.items()}
+            for route, scopes in routes.items()
+        }
+        self.retry_redis_after = retry_redis_after
+        self._script = None
+        self._redis_down_until = 0.0
+        self._buckets = LRUCache(maxsize=50000)
+
+    def rates_for(self, route: str) -> tuple[Rate, Rate]:
+        scopes = self.routes.get(route, {})
+        return scopes.get("key", self.default_per_key), scopes.get("org", self.default_per_org)
+
+    async def check(self, route: str, api_key: str, org: Optional[str]) -> RateLimitResult:
+        key_rate, org_rate = self.rates_for(route)
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        limits = [(f"rl:{route}:key:{key_hash}", key_rate)]
+        if org:
+            limits.append((f"rl:{route}:org:{org}", org_rate))
+
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                return await self._check_redis(limits)
+            except RedisError:
+                self._redis_down_until = time.monotonic() + self.retry_redis_after
+        return self._check_local(limits)
+
+    async def _check_redis(self, limits: list[tuple[str, Rate]]) -> RateLimitResult:
+        if self._script is None:
+            self._script = get_redis().register_script(_GCRA)
+        args = []
+        for _, rate in limits:
+            args += [rate.emission_ms, rate.period * 1000]
+        allowed, remaining, retry_after, reset, binding = await self._script(
+            keys=[key for key, _ in limits], args=args)
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limits[binding - 1][1].limit,
+            remaining=remaining,
+            reset=reset / 1000,
+            retry_after=retry_after / 1000,
+        )
+
+    def _check_local(self, limits: list[tuple[str, Rate]]) -> RateLimitResult:
+        now = time.monotonic()
+        buckets = []
+        for key, rate in limits:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != rate:
+                bucket = TokenBucket(rate)
+                self._buckets.set(key, bucket)
+            bucket.refill(now)
+            buckets.append(bucket)
+
+        binding = min(buckets, key=lambda b: b.tokens)
+        per_token = binding.rate.period / binding.rate.limit
+        if binding.tokens < 1:
+            return RateLimitResult(
+                allowed=False,
+                limit=binding.rate.limit,
+                remaining=0,
+                reset=(binding.rate.limit - binding.tokens) * per_token,
+                retry_after=(1 - binding.tokens) * per_token,
+            )
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return RateLimitResult(
+            allowed=True,
+            limit=binding.rate.limit,
+            remaining=int(binding.tokens),
+            reset=(binding.rate.limit - binding.tokens) * per_token,
+            retry_after=0,
+        )
+
+
+class RateLimitHeadersMiddleware:
+    """Adds the X-RateLimit-* headers stored in ``request.state`` to the response.
+
+    Done at the ASGI level so endpoints returning a Response directly
+    (pass-through and streaming bodies) carry them too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = scope.get("state", {}).get("rate_limit_headers")
+                if headers:
+                    existing = {name.lower() for name, _ in message.get("headers", [])}
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (name.lower().encode(), value.encode())
+                        for name, value in headers.items()
+                        if name.lower().encode() not in existing
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+rate_limiter = RateLimiter(
+    default_per_key=settings.RATE_LIMIT_PER_KEY,
+    default_per_org=settings.RATE_LIMIT_PER_ORG,
+    routes=settings.RATE_LIMIT_ROUTES,
+)
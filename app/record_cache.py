@@ -0,0 +1,119 @@
+import time
+from datetime import datetime
+from email.utils import format_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+import orjson
+
+from .cache import LRUCache
+from .config import settings
+
+
+# Performs the record request with the given extra headers and returns a
+# 200 or 304 response; anything else is expected to raise.
+RecordFetcher = Callable[[dict], Awaitable[httpx.Response]]
+
+
+def _http_date(modstamp: Optional[str]) -> Optional[str]:
+    """Convert a Salesforce datetime (``2024-01-31T10:00:00.000+0000``) to an HTTP date"""
+    if not modstamp:
+        return None
+    try:
+        return format_datetime(datetime.strptime(modstamp, "%Y-%m-%dT%H:%M:%S.%f%z"), usegmt=True)
+    except ValueError:
+        return None
+
+
+class RecordCache:
+    """Per-worker LRU of single-record reads.
+
+    Entries are keyed by org, caller, sObject, record ID and field set. The
+    caller is the hash of the client's bearer, so a record fetched under one
+    user's sharing rules and field-level security is never served to
+    another user without asking Salesforce. Within ``fresh_for`` seconds an entry is served
+    directly; after that it is revalidated with ``If-Modified-Since`` and a
+    304 counts as a hit. Entries hold the upstream body as raw bytes so it
+    can be passed through without re-encoding.
+    """
+
+    def __init__(self, maxsize: int, fresh_for: float):
+        self.fresh_for = fresh_for
+        self.local = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def key(
+        instance_url: str, caller: str, sobject: str, record_id: str, fields: Optional[list[str]]
+    ) -> tuple:
+        field_set = tuple(sorted({f.lower() for f in fields})) if fields else None
+        return (instance_url, caller, sobject.lower(), record_id, field_set)
+
+    async def get(
+        self,
+        instance_url: str,
+        caller: str,
+        sobject: str,
+        record_id: str,
+        fetch: RecordFetcher,
+        fields: Optional[list[str]] = None,
+    ) -> bytes:
+        key = self.key(instance_url, caller, sobject, record_id, fields)
+        entry = self.local.get(key)
+        if entry is not None and time.monotonic() - entry["checked_at"] < self.fresh_for:
+            self.hits += 1
+            return entry["content"]
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await fetch(headers)
+        if response.status_code == 304 and entry is not None:
+            self.hits += 1
+            self.revalidations += 1
+            entry["checked_at"] = time.monotonic()
+            return entry["content"]
+
+        self.misses += 1
+        last_modified = response.headers.get("Last-Modified")
+        if last_modified is None:
+            body = orjson.loads(response.content)
+            last_modified = (
+                _http_date(body.get("SystemModstamp"))
+                or _http_date(body.get("LastModifiedDate"))
+            )
+        entry = {
+            "content": response.content,
+            "etag": response.headers.get("ETag"),
+            "last_modified": last_modified,
+            "checked_at": time.monotonic(),
+        }
+        self.local.set(key, entry)
+        return entry["content"]
+
+    def invalidate(self, instance_url: str, sobject: str, record_id: str):
+        """Drop every cached field set of one record, for every caller"""
+        for key in self.local.keys():
+            if key[0] == instance_url and key[2:4] == (sobject.lower(), record_id):
+                self.local.pop(key)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "size": len(self.local),
+        }
+
+
+record_cache = RecordCache(
+    maxsize=settings.RECORD_CACHE_MAXSIZE,
+    fresh_for=settings.RECORD_CACHE_FRESH_SECONDS,
+)
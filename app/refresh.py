@@ -0,0 +1,182 @@
+import asyncio
+import json
+import secrets
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import get_redis
+from .config import settings
+from .database import SessionLocal
+from .models import SalesforceToken
+from .salesforce import salesforce_client
+from .token_cache import TokenInfo, hash_token, seal_upstream, token_cache, unseal_upstream
+
+
+# Compare-and-delete so a worker never releases a lock it no longer owns
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def identity_user_id(token_data: dict) -> Optional[str]:
+    """User ID from the identity URL of a token response, ``.../id/<org>/<user>``"""
+    identity = token_data.get("id")
+    return identity.rstrip("/").rsplit("/", 1)[-1] if identity else None
+
+
+async def refresh_salesforce_token(db: AsyncSession, token: SalesforceToken) -> SalesforceToken:
+    """Refresh Salesforce access token using refresh token.
+
+    Only ``upstream_token`` changes; the client's bearer (the row's key)
+    keeps working.
+    """
+    response = await salesforce_client.post(
+        settings.SALESFORCE_TOKEN_URL,
+        data={
+            "grant_type": "refresh_token",
+            "client_id": settings.SALESFORCE_CLIENT_ID,
+            "client_secret": settings.SALESFORCE_CLIENT_SECRET,
+            "refresh_token": token.refresh_token
+        }
+    )
+
+    await token_cache.invalidate(token.access_token)
+
+    if response.status_code != 200:
+        # Only drop the row when Salesforce rejected the refresh token itself;
+        # a transient upstream failure must not log the user out.
+        if response.status_code in (400, 401):
+            await db.delete(token)
+            await db.commit()
+        raise HTTPException(status_code=401, detail="Failed to refresh token")
+
+    token_data = response.json()
+    token.upstream_token = token_data["access_token"]
+    # Salesforce may rotate the refresh token as well
+    token.refresh_token = token_data.get("refresh_token", token.refresh_token)
+    token.user_id = identity_user_id(token_data) or token.user_id
+    token.created_at = datetime.utcnow()
+    await db.commit()
+
+    return token
+
+
+class RefreshCoordinator:
+    """Single-flight token refresh.
+
+    Concurrent callers in one worker share a single in-flight task per token;
+    across workers a Redis lock elects one refresher and the others pick up
+    its result from Redis.
+    """
+
+    def __init__(self, lock_ttl: float, wait_timeout: float, poll_interval: float = 0.05):
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def refresh(self, access_token: str, created_at: Optional[datetime] = None) -> TokenInfo:
+        """Refresh the token behind ``access_token``.
+
+        ``created_at`` is the token's age as the caller saw it; when the row
+        was refreshed after that, it is returned without calling Salesforce.
+        None forces a refresh, e.g. after Salesforce rejected the token.
+        """
+        key = hash_token(access_token)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh_shared(key, access_token, created_at))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _refresh_shared(
+        self, key: str, access_token: str, created_at: Optional[datetime] = None
+    ) -> TokenInfo:
+        lock_key = f"refresh_lock:{key}"
+        result_key = f"refresh_result:{key}"
+        owner = secrets.token_hex(8)
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            client = get_redis()
+            while True:
+                raw = await client.get(result_key)
+                if raw:
+                    return self._load_result(access_token, raw)
+                if await client.set(lock_key, owner, nx=True, px=int(self.lock_ttl * 1000)):
+                    break
+                if time.monotonic() > deadline:
+                    raise HTTPException(status_code=503, detail="Token refresh timed out")
+                await asyncio.sleep(self.poll_interval)
+        except RedisError:
+            return await self._refresh_local(access_token, created_at)
+
+        try:
+            try:
+                info = await self._refresh_local(access_token, created_at)
+            except HTTPException as exc:
+                await self._publish(client, result_key, {"error": exc.detail})
+                raise
+            await self._publish(client, result_key, {
+                "sealed_upstream": seal_upstream(info),
+                "instance_url": info.instance_url,
+                "created_at": info.created_at.isoformat(),
+            })
+            return info
+        finally:
+            try:
+                await client.eval(_RELEASE_LOCK, 1, lock_key, owner)
+            except RedisError:
+                pass
+
+    async def _publish(self, client, result_key: str, result: dict):
+        # The refresh itself already happened; waiters that miss the result
+        # fall back to refreshing once the lock is released
+        try:
+            await client.set(result_key, json.dumps(result), ex=int(self.lock_ttl))
+        except RedisError:
+            pass
+
+    @staticmethod
+    def _load_result(access_token: str, raw: bytes) -> TokenInfo:
+        data = json.loads(raw)
+        if "error" in data:
+            raise HTTPException(status_code=401, detail=data["error"])
+        try:
+            upstream_token = unseal_upstream(access_token, data.get("sealed_upstream"))
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Failed to refresh token")
+        return TokenInfo(
+            access_token=access_token,
+            instance_url=data["instance_url"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            upstream_token=upstream_token,
+        )
+
+    async def _refresh_local(self, access_token: str, created_at: Optional[datetime] = None) -> TokenInfo:
+        async with SessionLocal() as db:
+            db_token = await db.get(SalesforceToken, access_token)
+            if not db_token:
+                await token_cache.invalidate(access_token)
+                raise HTTPException(status_code=401, detail="Invalid access token")
+            # Refreshed by another worker since the caller loaded it, e.g. after
+            # its shared result expired but while the caller's cache entry lived
+            if created_at is None or db_token.created_at <= created_at:
+                db_token = await refresh_salesforce_token(db, db_token)
+            info = TokenInfo.from_model(db_token)
+        await token_cache.set(info)
+        return info
+
+
+refresh_coordinator = RefreshCoordinator(
+    lock_ttl=settings.TOKEN_REFRESH_LOCK_TTL,
+    wait_timeout=settings.TOKEN_REFRESH_WAIT_TIMEOUT,
+)
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from redis.exceptions import RedisError
+from sqlalchemy import select, text
+
+from .cache import close_redis, get_redis
+from .config import settings
+from .database import SessionLocal, dispose_engine, init_engine
+from .logs import configure_logging
+from .maintenance import maintenance_task
+from .metadata_index import metadata_index
+from .mirror import mirror_task
+from .models import SalesforceToken
+from .salesforce import salesforce_client
+from .scheduler import token_refresh_scheduler
+from .token_cache import TokenInfo, token_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_db(connections: int):
+    """Open ``connections`` pooled connections so first requests skip the handshake"""
+    engine = init_engine()
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def _warm_token_cache(limit: int):
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(SalesforceToken)
+            .order_by(SalesforceToken.created_at.desc())
+            .limit(limit)
+        )
+        for token in result.scalars():
+            await token_cache.set(TokenInfo.from_model(token))
+
+
+async def warm_up():
+    """Prime connection pools and caches before the worker reports ready"""
+    await _warm_db(settings.WARM_UP_DB_CONNECTIONS)
+    try:
+        await get_redis().ping()
+    except RedisError:
+        logger.warning("Redis unavailable during warm-up")
+    await _warm_token_cache(settings.WARM_UP_TOKEN_CACHE_SIZE)
+
+
+async def startup():
+    configure_logging()
+    init_engine()
+    salesforce_client.start()
+    if settings.WARM_UP_ON_STARTUP:
+        await warm_up()
+    if settings.TOKEN_REFRESH_SCHEDULER_ENABLED:
+        token_refresh_scheduler.start()
+    maintenance_task.start()
+    mirror_task.start()
+
+
+async def shutdown():
+    await mirror_task.stop()
+    await metadata_index.stop()
+    await maintenance_task.stop()
+    await token_refresh_scheduler.stop()
+    await salesforce_client.aclose()
+    await close_redis()
+    await dispose_engine()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create per-worker resources on startup and release them on shutdown.
+
+    The schema is managed by Alembic (``alembic upgrade head``), not here.
+    """
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
@@ -0,0 +1,92 @@
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+from .metrics import observe_upstream
+from .org_limiter import INTERACTIVE, org_limiter
+
+
+class SalesforceClient:
+    """Shared async HTTP client keeping one connection pool per Salesforce host"""
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._closed = False
+
+    def _build_client(self, origin: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=origin,
+            http2=settings.SALESFORCE_HTTP2,
+            timeout=httpx.Timeout(
+                settings.SALESFORCE_READ_TIMEOUT,
+                connect=settings.SALESFORCE_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.SALESFORCE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SALESFORCE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.SALESFORCE_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Return the pooled client for the scheme and host of ``url``"""
+        if self._closed:
+            raise RuntimeError("Salesforce client has been closed")
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(origin)
+        if client is None:
+            client = self._clients[origin] = self._build_client(origin)
+        return client
+
+    async def request(
+        self, method: str, url: str, priority: int = INTERACTIVE, endpoint: str = "default", **kwargs
+    ) -> httpx.Response:
+        """Send a request; data API calls go through the per-org concurrency limiter"""
+        parts = urlsplit(url)
+        if not parts.path.startswith("/services/data/"):
+            return await self._send(method, url, **kwargs)
+
+        async with org_limiter.slot(
+                f"{parts.scheme}://{parts.netloc}", priority, endpoint) as outcome:
+            try:
+                response = await self._send(method, url, **kwargs)
+            except httpx.TransportError:
+                outcome.ok = False
+                raise
+            outcome.limit_info = response.headers.get("Sforce-Limit-Info")
+            outcome.ok = response.status_code < 500 and not (
+                response.status_code == 403 and b"REQUEST_LIMIT_EXCEEDED" in response.content
+            )
+            return response
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.client_for(url).request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream(method, urlsplit(url).path, status, time.perf_counter() - start)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def start(self):
+        self._closed = False
+
+    async def aclose(self):
+        """Close every pooled connection; called on application shutdown"""
+        self._closed = True
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+salesforce_client = SalesforceClient()
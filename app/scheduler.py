@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import select, tuple_
+
+from .cache import LRUCache, get_redis
+from .config import settings
+from .database import SessionLocal
+from .models import SalesforceToken
+from .refresh import refresh_coordinator
+from .token_cache import hash_token
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenActivity:
+    """Marks tokens as recently used in Redis, writing at most once per interval per worker"""
+
+    def __init__(self, idle_after: int, touch_interval: float):
+        self.idle_after = idle_after
+        self._recent = LRUCache(maxsize=10000, ttl=touch_interval)
+
+    @staticmethod
+    def key(access_token: str) -> str:
+        return f"token_seen:{hash_token(access_token)}"
+
+    async def touch(self, access_token: str):
+        key = self.key(access_token)
+        if self._recent.get(key) is not None:
+            return
+        self._recent.set(key, True)
+        try:
+            await get_redis().set(key, 1, ex=self.idle_after)
+        except RedisError:
+            pass
+
+    async def active(self, access_tokens: list[str]) -> list[str]:
+        """Keep tokens used within ``idle_after``; tokens never seen count as
+        idle. If Redis is unavailable every token counts as active."""
+        if not access_tokens:
+            return []
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for access_token in access_tokens:
+                pipe.exists(self.key(access_token))
+            seen = await pipe.execute()
+        except RedisError:
+            return access_tokens
+        return [t for t, exists in zip(access_tokens, seen) if exists]
+
+
+class TokenRefreshScheduler:
+    """Refreshes active tokens shortly before they reach ``max_age``"""
+
+    def __init__(
+        self,
+        interval: float,
+        max_age: float,
+        refresh_before: float,
+        batch_size: int,
+        concurrency: int,
+        jitter: float,
+    ):
+        self.interval = interval
+        self.max_age = max_age
+        self.refresh_before = refresh_before
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval + random.uniform(0, self.jitter))
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Proactive token refresh failed")
+
+    async def _acquire_scan(self) -> bool:
+        # One worker scans per interval; others skip instead of racing
+        try:
+            return bool(await get_redis().set(
+                "token_refresh_scan", 1, nx=True, ex=max(int(self.interval), 1)))
+        except RedisError:
+            return True
+
+    async def _due_tokens(self) -> tuple[int, list[tuple[str, datetime]]]:
+        """Up to ``batch_size`` active tokens due for refresh, oldest first.
+
+        Idle tokens are filtered out page by page before the batch is cut,
+        so a backlog of idle tokens cannot starve the active ones. Returns
+        the number of due tokens looked at and the active ones with their
+        ``created_at``.
+
+        A token used within ``idle_after`` was refreshed lazily on that use
+        if it had reached ``max_age``, so older rows are idle and the scan
+        stops at ``idle_after + max_age``.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.max_age - self.refresh_before)
+        oldest = now - timedelta(seconds=token_activity.idle_after + self.max_age)
+        active: list[tuple[str, datetime]] = []
+        scanned = 0
+        after: Optional[tuple[datetime, str]] = None
+        async with SessionLocal() as db:
+            while len(active) < self.batch_size:
+                statement = (
+                    select(SalesforceToken.created_at, SalesforceToken.access_token)
+                    .where(SalesforceToken.created_at < cutoff, SalesforceToken.created_at > oldest)
+                    .order_by(SalesforceToken.created_at, SalesforceToken.access_token)
+                    .limit(self.batch_size)
+                )
+                if after is not None:
+                    statement = statement.where(
+                        tuple_(SalesforceToken.created_at, SalesforceToken.access_token) > after)
+                rows = (await db.execute(statement)).all()
+                if not rows:
+                    break
+                scanned += len(rows)
+                after = tuple(rows[-1])
+                created = {row.access_token: row.created_at for row in rows}
+                active += [(t, created[t]) for t in await token_activity.active(list(created))]
+                if len(rows) < self.batch_size:
+                    break
+        return scanned, active[:self.batch_size]
+
+    async def _refresh_one(self, semaphore: asyncio.Semaphore, access_token: str, created_at: datetime) -> bool:
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with semaphore:
+            try:
+                await refresh_coordinator.refresh(access_token, created_at)
+            except HTTPException:
+                return False
+        return True
+
+    async def run_once(self) -> int:
+        """Refresh one batch of due tokens; returns the number refreshed"""
+        if not await self._acquire_scan():
+            return 0
+        due, active = await self._due_tokens()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._refresh_one(semaphore, t, created_at) for t, created_at in active))
+        refreshed = sum(results)
+        if due:
+            logger.info(
+                "Proactive token refresh: %d due, %d active, %d refreshed",
+                due, len(active), refreshed)
+        return refreshed
+
+
+token_activity = TokenActivity(
+    idle_after=settings.TOKEN_IDLE_AFTER,
+    touch_interval=settings.TOKEN_ACTIVITY_TOUCH_INTERVAL,
+)
+
+token_refresh_scheduler = TokenRefreshScheduler(
+    interval=settings.TOKEN_REFRESH_SCAN_INTERVAL,
+    max_age=settings.TOKEN_MAX_AGE,
+    refresh_before=settings.TOKEN_REFRESH_BEFORE,
+    batch_size=settings.TOKEN_REFRESH_BATCH_SIZE,
+    concurrency=settings.TOKEN_REFRESH_CONCURRENCY,
+    jitter=settings.TOKEN_REFRESH_JITTER,
+)
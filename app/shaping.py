@@ -0,0 +1,186 @@
+"""Response shaping for the record, describe and query endpoints.
+
+Callers can ask for a subset of fields, drop nulls and Salesforce metadata
+(``attributes``, ``urls``), and cap the response at ``max_bytes``. A capped
+response carries a ``next_cursor`` that the same endpoint accepts to
+continue where it stopped.
+"""
+import base64
+import binascii
+import re
+from dataclasses import dataclass
+from typing import Annotated, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException, Query
+
+from .config import settings
+
+
+_FIELD = re.compile(r"^[A-Za-z]\w*(\.[A-Za-z]\w*)*$")
+_METADATA_KEYS = ("attributes", "urls")
+_SELECT_LIST = re.compile(r"^\s*SELECT\s+([^()]+?)\s+FROM\s", re.IGNORECASE)
+# Cursor offsets into a record's fields, a query page and the mirror
+_CURSOR_OFFSETS = ("f", "s", "o")
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(state)).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        state = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(state, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    for key in _CURSOR_OFFSETS:
+        value = state.get(key, 0)
+        # bool is an int subclass but never a valid offset
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(state.get("l", ""), str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return state
+
+
+def _field_tree(fields: list[str]) -> dict:
+    """``["Id", "Owner.Name"]`` -> ``{"id": None, "owner": {"name": None}}``"""
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.lower().split(".")
+        for part in parents:
+            if part in node and node[part] is None:
+                break  # the whole parent is already selected
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def _project(record: dict, tree: dict) -> dict:
+    projected = {}
+    for key, value in record.items():
+        lowered = key.lower()
+        if key == "attributes":
+            projected[key] = value
+        elif lowered in tree:
+            subtree = tree[lowered]
+            projected[key] = _project(value, subtree) if subtree and isinstance(value, dict) else value
+    return projected
+
+
+def _strip(value, nulls: bool, metadata: bool):
+    if isinstance(value, dict):
+        return {
+            k: _strip(v, nulls, metadata) for k, v in value.items()
+            if not (nulls and v is None) and not (metadata and k in _METADATA_KEYS)
+        }
+    if isinstance(value, list):
+        return [_strip(v, nulls, metadata) for v in value]
+    return value
+
+
+def project_soql(soql: str, fields: list[str]) -> Optional[str]:
+    """Replace a plain SELECT list with ``fields``; None when the query selects
+    subqueries, functions or TYPEOF and has to be projected locally"""
+    match = _SELECT_LIST.match(soql)
+    if not match or "typeof" in match.group(1).lower():
+        return None
+    return f"SELECT {', '.join(fields)} FROM {soql[match.end():]}"
+
+
+def fit(sizes: Iterable[int], budget: int, minimum: int = 1) -> int:
+    """How many leading items fit in ``budget`` bytes, but at least
+    ``minimum`` so that a cursor always makes progress"""
+    count = used = 0
+    for size in sizes:
+        used += size
+        if used > budget and count >= minimum:
+            break
+        count += 1
+    return count
+
+
+@dataclass
+class Shape:
+    fields: Optional[list[str]] = None
+    strip_nulls: bool = False
+    strip_metadata: bool = False
+    max_bytes: Optional[int] = None
+    cursor: Optional[dict] = None
+
+    def __post_init__(self):
+        self._tree = _field_tree(self.fields) if self.fields else None
+
+    @property
+    def passthrough(self) -> bool:
+        """True when upstream bytes can be returned untouched"""
+        return not (self.strip_nulls or self.strip_metadata or self.max_bytes or self.cursor)
+
+    def record(self, record: dict) -> dict:
+        """Project and strip one record"""
+        if self._tree is not None:
+            record = _project(record, self._tree)
+        if self.strip_nulls or self.strip_metadata:
+            record = _strip(record, self.strip_nulls, self.strip_metadata)
+        return record
+
+    def truncate_record(self, record: dict) -> dict:
+        """Apply the byte budget to a single record, field by field"""
+        start = self.cursor.get("f", 0) if self.cursor else 0
+        items = list(record.items())[start:]
+        if not self.max_bytes:
+            return dict(items)
+        count = fit((len(orjson.dumps({k: v})) for k, v in items), self.max_bytes)
+        shaped = dict(items[:count])
+        if count < len(items):
+            shaped["next_cursor"] = encode_cursor({"f": start + count})
+        return shaped
+
+    def describe(self, describe: dict) -> dict:
+        """Filter, strip and budget a describe result, paging through its fields"""
+        fields = describe.get("fields", [])
+        if self.fields:
+            wanted = {f.lower() for f in self.fields}
+            fields = [f for f in fields if f["name"].lower() in wanted]
+        shaped = {k: v for k, v in describe.items() if k != "fields"}
+        if self.strip_nulls or self.strip_metadata:
+            shaped = _strip(shaped, self.strip_nulls, self.strip_metadata)
+            fields = [_strip(f, self.strip_nulls, self.strip_metadata) for f in fields]
+
+        start = self.cursor.get("f", 0) if self.cursor else 0
+        fields = fields[start:]
+        count = len(fields)
+        if self.max_bytes:
+            budget = self.max_bytes - len(orjson.dumps(shaped))
+            count = fit((len(orjson.dumps(f)) + 1 for f in fields), budget)
+        shaped["fields"] = fields[:count]
+        if count < len(fields):
+            shaped["next_cursor"] = encode_cursor({"f": start + count})
+        return shaped
+
+
+def shape_params(
+    fields: Annotated[str | None, Query(description="Comma-separated fields to return")] = None,
+    strip_nulls: bool = False,
+    strip_metadata: bool = False,
+    max_bytes: Annotated[int | None, Query(ge=256)] = None,
+    cursor: Annotated[str | None, Query(description="next_cursor from a truncated response")] = None,
+) -> Shape:
+    """FastAPI dependency collecting the shaping query parameters"""
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        invalid = [f for f in field_list if not _FIELD.match(f)]
+        if invalid:
+            raise HTTPException(status_code=422, detail=f"Invalid field {invalid[0]!r}")
+    return Shape(
+        fields=field_list,
+        strip_nulls=strip_nulls,
+        strip_metadata=strip_metadata,
+        max_bytes=max_bytes or settings.RESPONSE_MAX_BYTES or None,
+        cursor=decode_cursor(cursor) if cursor else None,
+    )
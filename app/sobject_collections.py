@@ -0,0 +1,71 @@
+import asyncio
+from typing import Awaitable, Callable
+
+import httpx
+from fastapi import HTTPException
+
+from .config import settings
+
+
+# Performs an authenticated POST with the given JSON body and returns the
+# upstream response as-is.
+CollectionFetcher = Callable[[str, dict], Awaitable[httpx.Response]]
+
+
+async def retrieve_records(
+    fetch: CollectionFetcher,
+    instance_url: str,
+    sobject: str,
+    ids: list[str],
+    fields: list[str],
+    chunk_size: int = settings.COLLECTIONS_CHUNK_SIZE,
+    concurrency: int = settings.COLLECTIONS_CONCURRENCY,
+) -> dict[str, dict]:
+    """Fetch many records through sObject Collections retrieve calls.
+
+    IDs are deduplicated and split into chunks of ``chunk_size``, which run
+    with at most ``concurrency`` requests in flight. Every requested ID is
+    present in the result, either as ``{"record": ...}`` or ``{"error": ...}``.
+    """
+    url = f"{instance_url}/services/data/{settings.SALESFORCE_API_VERSION}/composite/sobjects/{sobject}"
+    unique_ids = list(dict.fromkeys(ids))
+    chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[str, dict] = {}
+
+    async def retrieve(chunk: list[str]):
+        async with semaphore:
+            try:
+                response = await fetch(url, {"ids": chunk, "fields": fields})
+            except HTTPException as exc:
+                for record_id in chunk:
+                    results[record_id] = {
+                        "error": "UPSTREAM_ERROR", "status": exc.status_code, "message": exc.detail,
+                    }
+                return
+            except httpx.HTTPError as exc:
+                for record_id in chunk:
+                    results[record_id] = {"error": "UPSTREAM_ERROR", "message": str(exc)}
+                return
+
+        if response.status_code != 200:
+            try:
+                errors = response.json()
+                message = errors[0].get("message") if errors else response.reason_phrase
+            except ValueError:
+                message = response.reason_phrase
+            for record_id in chunk:
+                results[record_id] = {
+                    "error": "UPSTREAM_ERROR",
+                    "status": response.status_code,
+                    "message": message,
+                }
+            return
+
+        for record_id, record in zip(chunk, response.json()):
+            results[record_id] = (
+                {"record": record} if record is not None else {"error": "NOT_FOUND"}
+            )
+
+    await asyncio.gather(*(retrieve(chunk) for chunk in chunks))
+    return {record_id: results[record_id] for record_id in unique_ids}
@@ -0,0 +1,51 @@
+from sqlalchemy import delete
+
+from .cache import get_redis
+from .config import settings
+from .database import SessionLocal
+from .models import OAuthState
+
+
+class RedisStateStore:
+    """OAuth states as Redis keys that expire on their own"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def key(state: str) -> str:
+        return f"oauth_state:{state}"
+
+    async def put(self, state: str):
+        await get_redis().set(self.key(state), 1, ex=self.ttl)
+
+    async def pop(self, state: str) -> bool:
+        """Atomically consume ``state``; False if it is unknown or expired"""
+        return await get_redis().getdel(self.key(state)) is not None
+
+
+class DatabaseStateStore:
+    """OAuth states as rows in ``oauth_states``"""
+
+    async def put(self, state: str):
+        async with SessionLocal() as db:
+            db.add(OAuthState(state=state))
+            await db.commit()
+
+    async def pop(self, state: str) -> bool:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(OAuthState)
+                .where(OAuthState.state == state)
+                .returning(OAuthState.state)
+            )
+            await db.commit()
+            return result.first() is not None
+
+
+STATE_STORES = {
+    "redis": lambda: RedisStateStore(ttl=settings.OAUTH_STATE_TTL),
+    "database": DatabaseStateStore,
+}
+
+oauth_state_store = STATE_STORES[settings.OAUTH_STATE_BACKEND]()
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from redis.exceptions import RedisError
+
+from .cache import LRUCache, get_redis
+from .config import settings
+from .models import SalesforceToken
+
+
+def hash_token(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _sealing_key(access_token: str) -> bytes:
+    # Must differ from hash_token(), which appears in Redis key names
+    return hashlib.sha256(b"upstream-token:" + access_token.encode()).digest()
+
+
+@dataclass
+class TokenInfo:
+    """Resolved bearer token as seen by request handlers.
+
+    ``access_token`` is the client's bearer and doubles as the refresh
+    handle: it is the primary key of the ``salesforce_tokens`` row holding
+    the refresh token. ``upstream_token`` is the Salesforce access token
+    currently behind it, which refreshes rotate without changing the bearer.
+    """
+    access_token: str
+    instance_url: str
+    created_at: datetime
+    upstream_token: Optional[str] = None
+
+    def __post_init__(self):
+        if self.upstream_token is None:
+            self.upstream_token = self.access_token
+
+    @classmethod
+    def from_model(cls, token: SalesforceToken) -> "TokenInfo":
+        return cls(
+            access_token=token.access_token,
+            instance_url=token.instance_url,
+            created_at=token.created_at,
+            upstream_token=token.upstream_token,
+        )
+
+
+def seal_upstream(info: TokenInfo) -> Optional[str]:
+    """Encrypt the upstream token for Redis under a key derived from the
+    bearer, so it is only readable by whoever presents that bearer. None
+    when the upstream token is the bearer itself, which is never stored."""
+    if info.upstream_token == info.access_token:
+        return None
+    nonce = os.urandom(12)
+    sealed = AESGCM(_sealing_key(info.access_token)).encrypt(nonce, info.upstream_token.encode(), None)
+    return base64.urlsafe_b64encode(nonce + sealed).decode()
+
+
+def unseal_upstream(access_token: str, sealed: Optional[str]) -> str:
+    """Inverse of seal_upstream; raises ValueError when ``sealed`` does not decrypt"""
+    if sealed is None:
+        return access_token
+    try:
+        raw = base64.urlsafe_b64decode(sealed)
+        return AESGCM(_sealing_key(access_token)).decrypt(raw[:12], raw[12:], None).decode()
+    except (binascii.Error, InvalidTag) as exc:
+        raise ValueError("Invalid sealed token") from exc
+
+
+class TokenCache:
+    """TTL cache (in-process + Redis) mapping a bearer token hash to its TokenInfo.
+
+    Redis never holds a usable token: entries are keyed by the bearer's hash
+    and the upstream token is stored encrypted with seal_upstream().
+    """
+
+    def __init__(self, maxsize: int, local_ttl: float, redis_ttl: int):
+        self.local = LRUCache(maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+
+    @staticmethod
+    def key(access_token: str) -> str:
+        return f"token:{hash_token(access_token)}"
+
+    async def get(self, access_token: str) -> Optional[TokenInfo]:
+        key = self.key(access_token)
+        info = self.local.get(key)
+        if info is not None:
+            return info
+        try:
+            raw = await get_redis().get(key)
+        except RedisError:
+            return None
+        if not raw:
+            return None
+        data = json.loads(raw)
+        if "upstream_token" in data:
+            # Written in plaintext by an older version; reload from the database
+            return None
+        try:
+            upstream_token = unseal_upstream(access_token, data.get("sealed_upstream"))
+        except ValueError:
+            return None
+        info = TokenInfo(
+            access_token=access_token,
+            instance_url=data["instance_url"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            upstream_token=upstream_token,
+        )
+        self.local.set(key, info)
+        return info
+
+    async def set(self, info: TokenInfo):
+        key = self.key(info.access_token)
+        self.local.set(key, info)
+        data = {
+            "instance_url": info.instance_url,
+            "created_at": info.created_at.isoformat(),
+            "sealed_upstream": seal_upstream(info),
+        }
+        try:
+            await get_redis().set(key, json.dumps(data), ex=self.redis_ttl)
+        except RedisError:
+            pass
+
+    async def invalidate(self, access_token: str):
+        key = self.key(access_token)
+        self.local.pop(key)
+        try:
+            await get_redis().delete(key)
+        except RedisError:
+            pass
+
+
+token_cache = TokenCache(
+    maxsize=settings.TOKEN_CACHE_MAXSIZE,
+    local_ttl=settings.TOKEN_CACHE_LOCAL_TTL,
+    redis_ttl=settings.TOKEN_CACHE_REDIS_TTL,
+)
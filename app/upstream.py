@@ -0,0 +1,194 @@
+import asyncio
+import random
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from .config import settings
+from .org_limiter import BULK, INTERACTIVE
+from .query import PageFetcher
+from .refresh import refresh_coordinator
+from .salesforce import salesforce_client
+from .token_cache import TokenInfo
+
+
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class CircuitBreaker:
+    """Per-org breaker: opens after consecutive failures, probes once after a cooldown"""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._open_until: dict[str, float] = {}
+        self._probing: set[str] = set()
+
+    def before_call(self, org: str):
+        open_until = self._open_until.get(org)
+        if open_until is None:
+            return
+        remaining = open_until - time.monotonic()
+        if remaining > 0 or org in self._probing:
+            raise HTTPException(
+                status_code=503,
+                detail="Salesforce is currently unavailable for this org",
+                headers={"Retry-After": str(max(int(remaining + 0.999), 1))},
+            )
+        # Half-open: let this call through as the probe
+        self._probing.add(org)
+
+    def release(self, org: str):
+        """End a probe without an outcome, e.g. when the call was shed or cancelled"""
+        self._probing.discard(org)
+
+    def record(self, org: str, ok: bool):
+        self._probing.discard(org)
+        if ok:
+            self._failures.pop(org, None)
+            self._open_until.pop(org, None)
+            return
+        failures = self._failures.get(org, 0) + 1
+        self._failures[org] = failures
+        if failures >= self.failure_threshold or org in self._open_until:
+            self._open_until[org] = time.monotonic() + self.cooldown
+
+    def state(self, org: str) -> str:
+        open_until = self._open_until.get(org)
+        if open_until is None:
+            return "closed"
+        return "open" if open_until > time.monotonic() else "half-open"
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    cooldown=settings.BREAKER_COOLDOWN,
+)
+
+
+def _timeout(endpoint: str) -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.UPSTREAM_TIMEOUTS.get(endpoint, settings.SALESFORCE_READ_TIMEOUT),
+        connect=settings.SALESFORCE_CONNECT_TIMEOUT,
+    )
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(
+        settings.UPSTREAM_RETRY_MAX_DELAY,
+        settings.UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt,
+    ))
+
+
+class SalesforceSession:
+    """Upstream call policy for one authenticated request.
+
+    Every Salesforce data call from an endpoint goes through here. It
+    applies:
+    - the per-endpoint timeout
+    - jittered exponential retries for idempotent calls on 5xx and
+      transport errors
+    - one token refresh and retry on 401
+    - the per-org circuit breaker
+    ``token`` always holds the current, possibly refreshed, token.
+    """
+
+    def __init__(self, token: TokenInfo):
+        self.token = token
+
+    @property
+    def instance_url(self) -> str:
+        return self.token.instance_url
+
+    def url(self, path: str) -> str:
+        """Absolute URL for an org-relative path such as ``/sobjects/Account``"""
+        return f"{self.token.instance_url}/services/data/{settings.SALESFORCE_API_VERSION}{path}"
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: str,
+        headers: Optional[dict] = None,
+        priority: int = INTERACTIVE,
+        **kwargs,
+    ) -> httpx.Response:
+        parts = urlsplit(url)
+        org = f"{parts.scheme}://{parts.netloc}"
+        retries = settings.UPSTREAM_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+        refreshed = False
+        attempt = 0
+
+        while True:
+            breaker.before_call(org)
+            request_headers = {
+                "Authorization": f"Bearer {self.token.upstream_token}",
+                "Content-Type": "application/json",
+                **(headers or {}),
+            }
+            try:
+                response = await salesforce_client.request(
+                    method, url, headers=request_headers, timeout=_timeout(endpoint),
+                    priority=priority, endpoint=endpoint, **kwargs)
+            except httpx.TransportError as exc:
+                breaker.record(org, ok=False)
+                if attempt < retries:
+                    await asyncio.sleep(_backoff(attempt))
+                    attempt += 1
+                    continue
+                raise HTTPException(
+                    status_code=504 if isinstance(exc, httpx.TimeoutException) else 502,
+                    detail="Salesforce request failed",
+                )
+            except BaseException:
+                # Shed by the org limiter, cancelled, ...: says nothing about
+                # Salesforce's health, but must not leave a probe in flight
+                breaker.release(org)
+                raise
+
+            breaker.record(org, ok=response.status_code not in RETRYABLE_STATUSES)
+
+            if response.status_code == 401 and not refreshed:
+                self.token = await refresh_coordinator.refresh(self.token.access_token)
+                refreshed = True
+                continue
+            if response.status_code in RETRYABLE_STATUSES and attempt < retries:
+                await asyncio.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+            return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def describe(
+        self, sobject: str, conditional_headers: Optional[dict] = None, priority: int = INTERACTIVE
+    ) -> httpx.Response:
+        """Describe ``sobject``; returns the 200 or 304 response and raises on
+        anything else. Fits describe_cache as ``partial(sf.describe, sobject)``"""
+        response = await self.get(
+            self.url(f"/sobjects/{sobject}/describe"),
+            endpoint="describe", headers=conditional_headers, priority=priority)
+        if response.status_code not in (200, 304):
+            raise HTTPException(status_code=response.status_code, detail=f"Failed to describe {sobject}")
+        return response
+
+    def query_fetcher(self, headers: Optional[dict] = None, priority: int = BULK) -> PageFetcher:
+        """Page fetcher for query_pages that raises on any non-200 page"""
+        async def fetch(url: str, params: Optional[dict]) -> httpx.Response:
+            response = await self.get(
+                url, endpoint="query", params=params, headers=headers, priority=priority)
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail="Failed to query records")
+            return response
+        return fetch
@@ -0,0 +1,266 @@
+"""Local Salesforce stand-in for benchmarks.
+
+Usage:
+    python -m benchmarks.fake_salesforce [--port 9000] [--latency-ms 50]
+        [--jitter-ms 20] [--error-rate 0.0] [--error-status 503]
+        [--total-records 5000] [--page-size 2000]
+
+Point the app at it with:
+    SALESFORCE_TOKEN_URL=http://localhost:9000/services/oauth2/token
+    SALESFORCE_USERINFO_URL=http://localhost:9000/services/oauth2/userinfo
+Issued tokens carry ``instance_url`` = this server, so every data call
+lands here too.
+"""
+import argparse
+import asyncio
+import random
+import re
+import secrets
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+class Behaviour:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    total_records: int = 5000
+    page_size: int = 2000
+    base_url: str = "http://localhost:9000"
+
+
+behaviour = Behaviour()
+app = FastAPI(title="Fake Salesforce")
+api_calls = 0
+
+MODIFIED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MODSTAMP = MODIFIED_AT.strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+LAST_MODIFIED = format_datetime(MODIFIED_AT, usegmt=True)
+DESCRIBE_ETAG = '"describe-v1"'
+STAGES = ["Prospecting", "Qualification", "Proposal", "Negotiation", "Closed Won", "Closed Lost"]
+
+
+@app.middleware("http")
+async def inject(request: Request, call_next):
+    global api_calls
+    delay = behaviour.latency_ms + random.uniform(-1, 1) * behaviour.jitter_ms
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if behaviour.error_rate and random.random() < behaviour.error_rate:
+        return JSONResponse(
+            [{"errorCode": "SERVER_UNAVAILABLE", "message": "Injected error"}],
+            status_code=behaviour.error_status)
+    response = await call_next(request)
+    if request.url.path.startswith("/services/data/"):
+        api_calls += 1
+        response.headers["Sforce-Limit-Info"] = f"api-usage={api_calls}/1000000"
+    return response
+
+
+def _token_payload() -> dict:
+    return {
+        "access_token": secrets.token_urlsafe(32),
+        "refresh_token": secrets.token_urlsafe(32),
+        "instance_url": behaviour.base_url,
+        "id": f"{behaviour.base_url}/id/00D000000000001/005000000000001",
+        "token_type": "Bearer",
+        "issued_at": str(int(datetime.utcnow().timestamp() * 1000)),
+    }
+
+
+@app.post("/services/oauth2/token")
+async def token():
+    return _token_payload()
+
+
+@app.get("/services/oauth2/userinfo")
+async def userinfo():
+    return {"user_id": "005000000000001", "organization_id": "00D000000000001"}
+
+
+def _field(name: str, type_: str = "string", **extra) -> dict:
+    return {"name": name, "label": name, "type": type_, "nillable": True, **extra}
+
+
+def _describe(sobject: str) -> dict:
+    fields = [_field("Id", "id"), _field("Name"), _field("SystemModstamp", "datetime")]
+    if sobject == "Opportunity":
+        fields += [_field("Amount", "currency", aggregatable=True),
+                   _field("StageName", "picklist", groupable=True),
+                   _field("CloseDate", "date", groupable=True)]
+    fields += [_field(f"Custom_{i}__c", "string", length=255) for i in range(200)]
+    return {"name": sobject, "label": sobject, "custom": False, "fields": fields}
+
+
+@app.get("/services/data/{version}/sobjects")
+async def describe_global(version: str, request: Request):
+    if request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+        return Response(status_code=304)
+    names = ["Account", "Contact", "Opportunity", "Task", "Event", "Case", "Lead"]
+    return JSONResponse(
+        {"sobjects": [{"name": n, "label": n, "queryable": True} for n in names]},
+        headers={"Last-Modified": LAST_MODIFIED})
+
+
+@app.get("/services/data/{version}/sobjects/{sobject}/describe")
+async def describe(version: str, sobject: str, request: Request):
+    if request.headers.get("If-None-Match") == DESCRIBE_ETAG:
+        return Response(status_code=304)
+    return JSONResponse(
+        _describe(sobject),
+        headers={"ETag": DESCRIBE_ETAG, "Last-Modified": LAST_MODIFIED})
+
+
+def _account(record_id: str) -> dict:
+    return {
+        "attributes": {"type": "Account", "url": f"/services/data/v59.0/sobjects/Account/{record_id}"},
+        "Id": record_id,
+        "Name": f"Account {record_id}",
+        "Industry": "Technology",
+        "AnnualRevenue": 1000000,
+        "Description": None,
+        "SystemModstamp": MODSTAMP,
+        "LastModifiedDate": MODSTAMP,
+    }
+
+
+@app.get("/services/data/{version}/sobjects/{sobject}/deleted/")
+async def get_deleted(version: str, sobject: str, start: str, end: str):
+    return {"deletedRecords": [], "earliestDateAvailable": MODSTAMP, "latestDateCovered": MODSTAMP}
+
+
+@app.get("/services/data/{version}/sobjects/Account/{record_id}")
+async def account(version: str, record_id: str, request: Request):
+    if record_id.startswith("404"):
+        return JSONResponse(
+            [{"errorCode": "NOT_FOUND", "message": "The requested resource does not exist"}],
+            status_code=404)
+    if request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+        return Response(status_code=304)
+    return JSONResponse(_account(record_id), headers={"Last-Modified": LAST_MODIFIED})
+
+
+def _related(sobject: str, account_id: str, n: int) -> dict:
+    return {
+        "attributes": {"type": sobject},
+        "Id": f"{sobject[:3].upper()}{account_id[3:15]}{n:03d}",
+        "AccountId": account_id,
+        "Name": f"{sobject} {n}",
+        "Subject": f"{sobject} {n}",
+        "ActivityDate": f"2024-01-{n + 1:02d}",
+    }
+
+
+def _subrequest(url: str, results: dict) -> dict:
+    """Answer one Composite subrequest, resolving @{ref.Field} references"""
+    for reference in re.findall(r"@\{(\w+)\.(\w+)\}", url):
+        body = results.get(reference[0], {}).get("body") or {}
+        if not isinstance(body, dict):
+            return {"body": [{"errorCode": "PROCESSING_HALTED"}], "httpStatusCode": 400}
+        url = url.replace(f"@{{{reference[0]}.{reference[1]}}}", str(body.get(reference[1])))
+    path, _, query_string = url.partition("?")
+    if "/sobjects/Account/" in path:
+        record_id = path.rsplit("/", 1)[1]
+        if record_id.startswith("404"):
+            return {"body": [{"errorCode": "NOT_FOUND"}], "httpStatusCode": 404}
+        return {"body": _account(record_id), "httpStatusCode": 200}
+    soql = unquote_plus(query_string.partition("q=")[2])
+    sobject = re.search(r"FROM (\w+)", re.sub(r"\(SELECT [^)]*\)", "", soql)).group(1)
+    ids = [i for i in re.findall(r"'(\w+)'", soql) if not i.startswith("404")]
+    if sobject == "Account":
+        records = [_account(i) for i in ids]
+        # Parent-child subqueries, e.g. (SELECT ... FROM Contacts ...)
+        for relationship in re.findall(r"\(SELECT [^)]*? FROM (\w+)", soql):
+            child = {"Contacts": "Contact", "Opportunities": "Opportunity"}.get(
+                relationship, relationship.rstrip("s"))
+            for record in records:
+                related = [_related(child, record["Id"], n) for n in range(2)]
+                record[relationship] = {"totalSize": 2, "done": True, "records": related}
+    else:
+        records = [_related(sobject, i, n) for i in ids for n in range(2)]
+    return {"body": {"totalSize": len(records), "done": True, "records": records}, "httpStatusCode": 200}
+
+
+@app.post("/services/data/{version}/composite")
+async def composite(version: str, request: Request):
+    body = await request.json()
+    results = {}
+    for subrequest in body["compositeRequest"]:
+        results[subrequest["referenceId"]] = {
+            "referenceId": subrequest["referenceId"], "httpHeaders": {},
+            **_subrequest(subrequest["url"], results),
+        }
+    return {"compositeResponse": list(results.values())}
+
+
+@app.post("/services/data/{version}/composite/sobjects/{sobject}")
+async def collections_retrieve(version: str, sobject: str, request: Request):
+    body = await request.json()
+    return [None if i.startswith("404") else _account(i) for i in body["ids"]]
+
+
+def _opportunity(n: int) -> dict:
+    return {
+        "attributes": {"type": "Opportunity"},
+        "Id": f"006{n:015d}",
+        "Name": f"Opportunity {n}",
+        "Amount": float(1000 + (n * 37) % 50000),
+        "StageName": STAGES[n % len(STAGES)],
+        "CloseDate": f"2024-{n % 12 + 1:02d}-15",
+        "SystemModstamp": MODSTAMP,
+    }
+
+
+def _page(offset: int, version: str) -> dict:
+    end = min(offset + behaviour.page_size, behaviour.total_records)
+    body = {
+        "totalSize": behaviour.total_records,
+        "done": end >= behaviour.total_records,
+        "records": [_opportunity(n) for n in range(offset, end)],
+    }
+    if not body["done"]:
+        body["nextRecordsUrl"] = f"/services/data/{version}/query/01g-{end}"
+    return body
+
+
+@app.get("/services/data/{version}/query")
+@app.get("/services/data/{version}/queryAll")
+async def query(version: str, q: str):
+    return _page(0, version)
+
+
+@app.get("/services/data/{version}/query/{locator}")
+async def query_more(version: str, locator: str):
+    return _page(int(locator.rsplit("-", 1)[1]), version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Salesforce stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--total-records", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    behaviour.latency_ms = args.latency_ms
+    behaviour.jitter_ms = args.jitter_ms
+    behaviour.error_rate = args.error_rate
+    behaviour.error_status = args.error_status
+    behaviour.total_records = args.total_records
+    behaviour.page_size = args.page_size
+    behaviour.base_url = f"http://{args.host}:{args.port}"
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Load driver for the app, meant to run against benchmarks.fake_salesforce.
+
+Usage:
+    python -m benchmarks.load [--base-url http://localhost:8000]
+        [--concurrency 1,10,50] [--duration 10]
+        [--scenarios health,accounts,metadata,callback]
+        [--output baseline.json]
+
+A bearer token is obtained through /callback first, so the app must be
+configured against the fake server. Raise RATE_LIMIT_PER_KEY and
+RATE_LIMIT_PER_ORG for the app under test, or the limiter will dominate
+the numbers.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def scenario_request(name: str, token: str) -> tuple[str, str, dict]:
+    auth = {"headers": {"Authorization": f"Bearer {token}"}}
+    if name == "health":
+        return "GET", "/health", {}
+    if name == "accounts":
+        return "GET", f"/accounts/001{random.randrange(1000):015d}", auth
+    if name == "metadata":
+        return "GET", "/metadata", auth
+    if name == "callback":
+        return "POST", "/callback", {"data": {"code": "benchmark"}}
+    raise ValueError(f"Unknown scenario {name}")
+
+
+async def run_level(client: httpx.AsyncClient, scenario: str, token: str,
+                    concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, kwargs = scenario_request(scenario, token)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "transport_errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        response = await client.post("/callback", data={"code": "benchmark"})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        results = []
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = await run_level(client, scenario, token, concurrency, args.duration)
+                print(json.dumps(result))
+                results.append(result)
+
+    return {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "base_url": args.base_url,
+        "duration_per_level": args.duration,
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load driver for the app")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--concurrency", default="1,10,50",
+        type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--scenarios", default="health,accounts,metadata,callback",
+        type=lambda v: v.split(","))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
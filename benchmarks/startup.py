@@ -0,0 +1,80 @@
+"""Cold-start benchmark: import time of app.main and lifespan startup time.
+
+Usage:
+    python -m benchmarks.startup [--runs 10] [--lifespan] [--output startup.json]
+
+Each import run happens in a fresh interpreter so module caches do not
+skew the numbers. ``--lifespan`` additionally times the application
+lifespan startup/shutdown in-process, which needs Postgres and Redis.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def measure_import(runs: int) -> list[float]:
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            capture_output=True, text=True, check=True,
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+async def measure_lifespan(runs: int) -> list[tuple[float, float]]:
+    from app.main import app
+
+    samples = []
+    for _ in range(runs):
+        context = app.router.lifespan_context(app)
+        start = time.perf_counter()
+        await context.__aenter__()
+        started = time.perf_counter()
+        await context.__aexit__(None, None, None)
+        samples.append((started - start, time.perf_counter() - started))
+    return samples
+
+
+def summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--lifespan", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    report = {"import": summarize(measure_import(args.runs))}
+    if args.lifespan:
+        samples = asyncio.run(measure_lifespan(args.runs))
+        report["startup"] = summarize([s for s, _ in samples])
+        report["shutdown"] = summarize([s for _, s in samples])
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
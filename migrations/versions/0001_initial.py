@@ -0,0 +1,46 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "oauth_states",
+        sa.Column("state", sa.String(), primary_key=True),
+        sa.Column("created_at", sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "salesforce_tokens",
+        sa.Column("access_token", sa.String(), primary_key=True),
+        sa.Column("refresh_token", sa.String()),
+        sa.Column("instance_url", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "api_keys",
+        sa.Column("api_key", sa.String(), primary_key=True),
+        sa.Column("email", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_index("ix_api_keys_api_key", "api_keys", ["api_key"], if_not_exists=True)
+    op.create_index("ix_api_keys_email", "api_keys", ["email"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table("api_keys")
+    op.drop_table("salesforce_tokens")
+    op.drop_table("oauth_states")
@@ -0,0 +1,34 @@
+"""Index created_at for time-based scans and pruning
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_salesforce_tokens_created_at", "salesforce_tokens", ["created_at"],
+            postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(
+            "ix_oauth_states_created_at", "oauth_states", ["created_at"],
+            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_oauth_states_created_at", table_name="oauth_states",
+            postgresql_concurrently=True, if_exists=True)
+        op.drop_index(
+            "ix_salesforce_tokens_created_at", table_name="salesforce_tokens",
+            postgresql_concurrently=True, if_exists=True)
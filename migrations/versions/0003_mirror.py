@@ -0,0 +1,43 @@
+"""Local mirror of selected sObjects
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "mirrored_records",
+        sa.Column("instance_url", sa.String(), primary_key=True),
+        sa.Column("sobject", sa.String(), primary_key=True),
+        sa.Column("record_id", sa.String(), primary_key=True),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("system_modstamp", sa.DateTime()),
+        sa.Column("synced_at", sa.DateTime()),
+    )
+    op.create_index(
+        "ix_mirrored_records_modstamp", "mirrored_records",
+        ["instance_url", "sobject", "system_modstamp"])
+    op.create_table(
+        "mirror_watermarks",
+        sa.Column("instance_url", sa.String(), primary_key=True),
+        sa.Column("sobject", sa.String(), primary_key=True),
+        sa.Column("last_modstamp", sa.DateTime()),
+        sa.Column("deleted_until", sa.DateTime()),
+        sa.Column("last_synced_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("mirror_watermarks")
+    op.drop_index("ix_mirrored_records_modstamp", table_name="mirrored_records")
+    op.drop_table("mirrored_records")
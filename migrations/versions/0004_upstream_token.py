@@ -0,0 +1,24 @@
+"""Keep the client's bearer stable across refreshes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("salesforce_tokens", sa.Column("upstream_token", sa.String(), nullable=True))
+    # Rows that were never refreshed use their key as the upstream token
+    op.execute("UPDATE salesforce_tokens SET upstream_token = access_token WHERE upstream_token IS NULL")
+
+
+def downgrade():
+    op.drop_column("salesforce_tokens", "upstream_token")
@@ -0,0 +1,23 @@
+"""Record the Salesforce user of each token
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in at login and on the next refresh of existing tokens
+    op.add_column("salesforce_tokens", sa.Column("user_id", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("salesforce_tokens", "user_id")
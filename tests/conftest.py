@@ -0,0 +1,10 @@
+import os
+
+# Settings requires the OAuth client configuration; tests never reach Salesforce
+for name in (
+    "SALESFORCE_CLIENT_ID",
+    "SALESFORCE_CLIENT_SECRET",
+    "SALESFORCE_REDIRECT_URI",
+    "CHATGPT_REDIRECT_URI",
+):
+    os.environ.setdefault(name, "test")
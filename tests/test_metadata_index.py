@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+from redis.exceptions import RedisError
+
+from app import metadata_index as module
+from app.metadata_index import MetadataIndex, OrgIndex
+from app.token_cache import TokenInfo
+from app.upstream import SalesforceSession
+
+ORG = "https://example.my.salesforce.com"
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class UnavailableRedis:
+    def __getattr__(self, name):
+        raise RedisError("unavailable")
+
+
+class FakeSession(SalesforceSession):
+    def __init__(self):
+        super().__init__(TokenInfo("token", ORG, datetime.utcnow()))
+        self.calls = []
+
+    async def get(self, url: str, headers: dict, **kwargs) -> httpx.Response:
+        path = url.removeprefix(self.url(""))
+        self.calls.append((path, headers))
+        if path == "/sobjects":
+            if headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return httpx.Response(304)
+            return httpx.Response(
+                200, json={"sobjects": [{"name": "Account"}, {"name": "Contact"}]},
+                headers={"Last-Modified": LAST_MODIFIED})
+        if headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"fields": [{"name": "Id", "type": "id"}]}, headers={"ETag": '"v1"'})
+
+
+def test_unchanged_describe_global_skips_the_crawl(monkeypatch):
+    monkeypatch.setattr(module, "get_redis", UnavailableRedis)
+    index = MetadataIndex(maxsize=10, local_ttl=300, refresh_after=0, redis_ttl=60)
+    sf = FakeSession()
+
+    async def scenario():
+        org = await index.ensure(sf)
+        await org.crawl
+        assert org.summary()["complete"]
+
+        sf.calls.clear()
+        await index.ensure(sf)
+        assert sf.calls == [("/sobjects", {"If-Modified-Since": LAST_MODIFIED})]
+
+        # A changed object list revalidates indexed objects instead of downloading them
+        org.last_modified = "Tue, 02 Jan 2024 00:00:00 GMT"
+        sf.calls.clear()
+        await index.ensure(sf)
+        await org.crawl
+        describes = [headers for path, headers in sf.calls if path != "/sobjects"]
+        assert len(describes) == 2
+        assert all(headers["If-None-Match"] == '"v1"' for headers in describes)
+
+    asyncio.run(scenario())
+
+
+def test_stop_cancels_and_awaits_crawls_of_expired_entries():
+    index = MetadataIndex(maxsize=10, local_ttl=0.001, refresh_after=3600, redis_ttl=60)
+
+    async def scenario():
+        crawl = asyncio.create_task(asyncio.sleep(60))
+        index.local.set(ORG, OrgIndex(crawl=crawl))
+        await asyncio.sleep(0.01)
+        await index.stop()
+        assert crawl.cancelled()
+
+    asyncio.run(scenario())
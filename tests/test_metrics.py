@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from app.metrics import org_label, render_metrics
+from app.org_limiter import org_limiter
+
+ORG = "https://example.my.salesforce.com"
+
+
+def get(path: str, headers: dict = None) -> httpx.Response:
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/health/db"])
+def test_internal_endpoints_require_the_internal_token(monkeypatch, path):
+    monkeypatch.setattr(main.settings, "INTERNAL_TOKEN", "")
+    assert get(path).status_code == 404
+
+    monkeypatch.setattr(main.settings, "INTERNAL_TOKEN", "secret")
+    assert get(path).status_code == 401
+    assert get(path, {"Authorization": "Bearer wrong"}).status_code == 401
+    assert get(path, {"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_metrics_content_type_has_a_single_charset(monkeypatch):
+    monkeypatch.setattr(main.settings, "INTERNAL_TOKEN", "secret")
+    response = get("/metrics", {"Authorization": "Bearer secret"})
+    assert response.headers["content-type"].count("charset") == 1
+
+
+def test_org_gauges_are_labelled_without_the_instance_url():
+    org_limiter.state(ORG)
+    body = render_metrics()[0].decode()
+    assert ORG not in body
+    assert f'salesforce_org_limit{{org="{org_label(ORG)}"}}' in body
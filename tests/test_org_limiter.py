@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import org_limiter as module
+from app.org_limiter import INTERACTIVE, OrgConcurrencyLimiter
+
+
+def make_limiter(**overrides) -> OrgConcurrencyLimiter:
+    options = dict(
+        initial_limit=1, min_limit=1, max_limit=10, latency_tolerance=3.0,
+        max_queue=10, queue_timeout=5.0, bulk_reserve=0.0, sync_interval=3600.0,
+        usage_max_age=60.0,
+    )
+    options.update(overrides)
+    return OrgConcurrencyLimiter(**options)
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = make_limiter()
+        state = limiter.state("org")
+        await limiter._acquire(state, 0)
+
+        waiter = asyncio.create_task(limiter._acquire(state, 0))
+        await asyncio.sleep(0)
+        assert len(state.waiters) == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert state.waiters == []
+        limiter._release_slot(state)
+        assert state.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_returns_a_slot_granted_before_it_resumed():
+    async def scenario():
+        limiter = make_limiter()
+        state = limiter.state("org")
+        await limiter._acquire(state, 0)
+
+        waiter = asyncio.create_task(limiter._acquire(state, 0))
+        await asyncio.sleep(0)
+        # Hand the slot over and cancel before the waiter gets to run
+        limiter._release_slot(state)
+        waiter.cancel()
+        [result] = await asyncio.gather(waiter, return_exceptions=True)
+        if not isinstance(result, asyncio.CancelledError):
+            # wait_for may complete instead of raising; then the caller owns the slot
+            limiter._release_slot(state)
+
+        assert state.in_flight == 0
+        assert state.waiters == []
+
+    asyncio.run(scenario())
+
+
+def test_latency_baseline_is_per_endpoint_kind():
+    limiter = make_limiter(initial_limit=8)
+    state = limiter.state("org")
+    limiter._adjust(state, "record", 0.05, ok=True)
+    limiter._adjust(state, "query", 2.0, ok=True)
+    assert state.limit > 8
+
+
+class UsageHash:
+    def __init__(self, values):
+        self.values = values
+
+    async def hmget(self, key, *fields):
+        return self.values
+
+
+def test_stale_exhausted_allocation_lets_one_probe_through():
+    limiter = make_limiter()
+    state = limiter.state("org")
+    state.api_used, state.api_max = 5000, 5000
+    state.api_observed_at = time.time() - 120
+    state.api_synced_at = time.monotonic()
+
+    async def scenario():
+        await limiter._check_allocation("org", state, INTERACTIVE)
+        with pytest.raises(HTTPException) as exc:
+            await limiter._check_allocation("org", state, INTERACTIVE)
+        assert exc.value.status_code == 429
+
+    asyncio.run(scenario())
+
+
+def test_missing_usage_hash_clears_local_usage(monkeypatch):
+    monkeypatch.setattr(module, "get_redis", lambda: UsageHash([None, None, None]))
+    limiter = make_limiter(sync_interval=0.0)
+    state = limiter.state("org")
+    state.api_used, state.api_max = 5000, 5000
+    state.api_observed_at = time.time()
+
+    asyncio.run(limiter._check_allocation("org", state, INTERACTIVE))
+    assert state.api_used is None and state.api_max is None
+
+
+def test_cancelled_call_does_not_shrink_the_cap():
+    limiter = make_limiter(initial_limit=8)
+    state = limiter.state("org")
+
+    async def call():
+        async with limiter.slot("org", kind="query"):
+            await asyncio.sleep(60)
+
+    async def scenario():
+        for _ in range(4):
+            task = asyncio.create_task(call())
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert state.limit == 8
+    assert state.in_flight == 0
@@ -0,0 +1,40 @@
+import asyncio
+import re
+from urllib.parse import unquote_plus
+
+import httpx
+
+from app.overview import account_overviews
+
+ORG = "https://example.my.salesforce.com"
+
+
+def test_related_rows_are_limited_per_account_not_per_chunk():
+    queries = []
+
+    async def fetch(url: str, body: dict) -> httpx.Response:
+        responses = []
+        for subrequest in body["compositeRequest"]:
+            soql = unquote_plus(subrequest["url"].partition("q=")[2])
+            queries.append(soql)
+            ids = re.findall(r"'(\w+)'", soql)
+            # The first account is busy: it has many more contacts than the limit
+            records = [
+                {"Id": account_id, "Contacts": {"records": [{"Id": f"c{n}"} for n in range(2 if i else 3)]},
+                 "Opportunities": None, "Tasks": None, "Events": None}
+                for i, account_id in enumerate(ids)
+            ]
+            responses.append({
+                "referenceId": subrequest["referenceId"], "httpStatusCode": 200,
+                "body": {"totalSize": len(records), "done": True, "records": records},
+            })
+        return httpx.Response(200, json={"compositeResponse": responses})
+
+    ids = [f"001{n:015d}" for n in range(7)]
+    results = asyncio.run(account_overviews(fetch, ORG, ids, limit=3, chunk_size=2))
+
+    assert len(queries) == 4
+    assert all("(SELECT" in soql and "FROM Contacts" in soql and "LIMIT 3)" in soql for soql in queries)
+    assert all(len(results[account_id]["contacts"]) == 2 for account_id in ids[1::2])
+    assert results[ids[0]]["opportunities"] == []
+    assert "Contacts" not in results[ids[0]]["account"]
@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+
+from app.record_cache import RecordCache
+
+ORG = "https://example.my.salesforce.com"
+
+
+def test_entries_are_not_shared_between_callers():
+    cache = RecordCache(maxsize=10, fresh_for=60)
+    calls = []
+
+    def fetcher(caller: str):
+        async def fetch(headers: dict) -> httpx.Response:
+            calls.append(caller)
+            return httpx.Response(200, json={"Id": "001A", "Name": f"seen by {caller}"})
+        return fetch
+
+    async def scenario():
+        first = await cache.get(ORG, "alice", "Account", "001A", fetcher("alice"))
+        again = await cache.get(ORG, "alice", "Account", "001A", fetcher("alice"))
+        other = await cache.get(ORG, "bob", "Account", "001A", fetcher("bob"))
+        return first, again, other
+
+    first, again, other = asyncio.run(scenario())
+    assert first == again
+    assert b"seen by bob" in other
+    assert calls == ["alice", "bob"]
+
+    cache.invalidate(ORG, "Account", "001A")
+    assert len(cache.local) == 0
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from redis.exceptions import RedisError
+
+from app import refresh
+from app.refresh import RefreshCoordinator
+from app.models import SalesforceToken
+from app.token_cache import TokenInfo
+
+
+class ResultWriteFails:
+    """Grants the lock, then fails the write of the refresh result"""
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, nx=False, **kwargs):
+        if nx:
+            return True
+        raise RedisError("connection lost")
+
+    async def eval(self, *args):
+        return 1
+
+
+def test_refresh_succeeds_when_publishing_the_result_fails(monkeypatch):
+    info = TokenInfo("bearer", "https://example.my.salesforce.com", datetime.utcnow(), "upstream")
+    coordinator = RefreshCoordinator(lock_ttl=5, wait_timeout=1)
+
+    async def refresh_local(access_token, created_at):
+        return info
+
+    monkeypatch.setattr(refresh, "get_redis", ResultWriteFails)
+    monkeypatch.setattr(coordinator, "_refresh_local", refresh_local)
+
+    assert asyncio.run(coordinator._refresh_shared("key", "bearer")) is info
+
+
+class OneRowSession:
+    def __init__(self, row):
+        self.row = row
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, key):
+        return self.row
+
+
+def test_row_refreshed_since_the_caller_loaded_it_is_not_refreshed_again(monkeypatch):
+    refreshed_at = datetime.utcnow()
+    row = SalesforceToken(
+        access_token="bearer", upstream_token="new", instance_url="https://example.my.salesforce.com",
+        created_at=refreshed_at)
+    posts = []
+
+    async def refresh_salesforce_token(db, token):
+        posts.append(token.access_token)
+        return token
+
+    async def cache_set(info):
+        pass
+
+    monkeypatch.setattr(refresh, "SessionLocal", lambda: OneRowSession(row))
+    monkeypatch.setattr(refresh, "refresh_salesforce_token", refresh_salesforce_token)
+    monkeypatch.setattr(refresh.token_cache, "set", cache_set)
+    coordinator = RefreshCoordinator(lock_ttl=5, wait_timeout=1)
+
+    stale = refreshed_at - timedelta(minutes=1)
+    info = asyncio.run(coordinator._refresh_local("bearer", stale))
+    assert info.upstream_token == "new" and posts == []
+
+    asyncio.run(coordinator._refresh_local("bearer", refreshed_at))
+    asyncio.run(coordinator._refresh_local("bearer"))
+    assert posts == ["bearer", "bearer"]
@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+from app.shaping import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("state", [
+    {"f": -1}, {"f": "3"}, {"f": 1.5}, {"f": True}, {"s": -5}, {"o": None}, {"l": 7}, {"l": ["x"]},
+])
+def test_malformed_cursor_values_are_rejected(state):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(encode_cursor(state))
+    assert exc.value.status_code == 400
+
+
+def test_valid_cursor_round_trips():
+    state = {"l": "/services/data/v59.0/query/01g-2000", "s": 10, "f": 0}
+    assert decode_cursor(encode_cursor(state)) == state
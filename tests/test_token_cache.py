@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime
+
+from app import token_cache as module
+from app.token_cache import TokenCache, TokenInfo
+
+ORG = "https://example.my.salesforce.com"
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_redis_entries_hold_no_usable_token(monkeypatch):
+    redis = DictRedis()
+    monkeypatch.setattr(module, "get_redis", lambda: redis)
+    fresh = TokenInfo("bearer-token", ORG, datetime.utcnow())
+    refreshed = TokenInfo("rotated-bearer", ORG, datetime.utcnow(), "upstream-secret")
+
+    async def scenario():
+        for info in (fresh, refreshed):
+            await TokenCache(maxsize=10, local_ttl=60, redis_ttl=60).set(info)
+        # A new worker only has Redis to go on
+        cache = TokenCache(maxsize=10, local_ttl=60, redis_ttl=60)
+        return await cache.get("bearer-token"), await cache.get("rotated-bearer")
+
+    loaded_fresh, loaded_refreshed = asyncio.run(scenario())
+    stored = " ".join(redis.data.values())
+    assert "bearer-token" not in stored and "upstream-secret" not in stored
+    assert loaded_fresh.upstream_token == "bearer-token"
+    assert loaded_refreshed.upstream_token == "upstream-secret"
@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app import upstream
+from app.token_cache import TokenInfo
+from app.upstream import CircuitBreaker, SalesforceSession
+
+ORG = "https://example.my.salesforce.com"
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record(ORG, ok=False)
+    return breaker
+
+
+@pytest.mark.parametrize("error", [
+    HTTPException(status_code=429, detail="shed"),
+    asyncio.CancelledError(),
+    RuntimeError("refresh failed"),
+])
+def test_probe_is_released_when_the_call_fails_without_an_outcome(monkeypatch, error):
+    breaker = open_breaker()
+    monkeypatch.setattr(upstream, "breaker", breaker)
+
+    async def failing_request(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(upstream.salesforce_client, "request", failing_request)
+    session = SalesforceSession(TokenInfo("token", ORG, datetime.utcnow()))
+
+    async def scenario():
+        with pytest.raises(type(error)):
+            await session.get(session.url("/limits"), endpoint="record")
+
+    asyncio.run(scenario())
+    # The next call is allowed through as a fresh probe instead of a 503
+    breaker.before_call(ORG)